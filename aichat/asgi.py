@@ -1,5 +1,9 @@
 """
 ASGI config for aichat project.
+
+Serve with an ASGI server (e.g. ``uvicorn aichat.asgi:application``) so that
+streaming endpoints such as /api/chat/stream/ flush each event as it is
+produced. Under WSGI the stream is buffered until the response completes.
 """
 
 import os
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chat.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -131,8 +132,200 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Logging: one key=value line per record on stderr, at LOG_LEVEL for this project's
+# modules (Django itself stays at WARNING). Latency and cache metrics are served at /metrics
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'logfmt': {
+            'format': 'ts=%(asctime)s level=%(levelname)s logger=%(name)s process=%(process)d msg="%(message)s"',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'logfmt',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'chat': {
+            'level': LOG_LEVEL,
+        },
+    },
+}
+
 # Gemini API Key
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
 # VectorDB settings
 VECTORDB_PATH = BASE_DIR / 'vectordb'
+# 'embedded' opens VECTORDB_PATH in every process; 'server' connects all workers to
+# one `python manage.py vectordb_server` process that owns the index. With
+# VECTORDB_SERVER_FALLBACK, workers open the index in-process if no server answers.
+VECTORDB_MODE = os.getenv('VECTORDB_MODE', 'embedded')
+VECTORDB_HOST = os.getenv('VECTORDB_HOST', '127.0.0.1')
+VECTORDB_PORT = int(os.getenv('VECTORDB_PORT', '8001'))
+VECTORDB_SERVER_FALLBACK = DEBUG
+# 'per_conversation' keeps one collection per chat; 'shared' stores all chunks in
+# VECTORDB_SHARDS collections filtered by conversation. Existing per-conversation
+# collections are folded in with `python manage.py migrate_vectordb_collections`.
+VECTORDB_INDEX_MODE = os.getenv('VECTORDB_INDEX_MODE', 'per_conversation')
+VECTORDB_SHARDS = 4
+# Open collection handles kept per process
+VECTORDB_HANDLE_CACHE_SIZE = 1024
+# Chunks embedded and inserted per Chroma write (capped at the client's max batch size)
+VECTORDB_BATCH_SIZE = 128
+# Number of batches embedded concurrently during ingestion
+VECTORDB_EMBEDDING_WORKERS = 1
+
+# Retrieval: RETRIEVAL_CANDIDATES chunks each from the vector store and (with
+# RETRIEVAL_HYBRID) the BM25 keyword index are fused with reciprocal rank fusion;
+# the best RETRIEVAL_MAX_CHUNKS are merged into passages and trimmed to
+# RETRIEVAL_MAX_TOKENS. Documents ingested before the keyword index existed are
+# only found through their vectors until they are uploaded again.
+RETRIEVAL_HYBRID = True
+KEYWORD_INDEX_PATH = BASE_DIR / 'cache' / 'keyword_index.sqlite3'
+RETRIEVAL_CANDIDATES = 20
+RETRIEVAL_RRF_K = 60
+RETRIEVAL_MAX_CHUNKS = 8
+RETRIEVAL_MAX_TOKENS = 1500
+# Retrieval results reused per process for repeated questions, dropped as soon as
+# the conversation gets new chunks
+RETRIEVAL_CACHE_TTL = 60
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024
+
+# Embedding backend: 'local' (all-MiniLM-L6-v2 on CPU), 'gemini' (remote) or
+# 'hashing' (deterministic, for tests). Switching providers changes the vector
+# dimension, so existing documents must be re-ingested.
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'local')
+# Simulated seconds per call of the 'hashing' provider, standing in for a remote model
+EMBEDDING_HASHING_LATENCY = 0.0
+GEMINI_EMBEDDING_MODEL = 'models/embedding-001'
+# Load the embedding model when the AI service is warmed up rather than on first use
+EMBEDDING_WARMUP = True
+
+# The AI service builds its LLM, vector store and embedding clients on first use.
+# Set AI_SERVICE_PREWARM=1 in production to build them (in a background thread)
+# as soon as a web or ingestion worker starts; leave it off so management
+# commands such as migrate and check stay fast.
+AI_SERVICE_PREWARM = os.getenv('AI_SERVICE_PREWARM', '0') == '1'
+
+# Embedding cache shared by ingestion and retrieval, keyed by model and text hash
+EMBEDDING_CACHE_PATH = BASE_DIR / 'cache' / 'embeddings.sqlite3'
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# PDF extraction: page ranges of PDF_PAGES_PER_TASK pages are spread over
+# PDF_EXTRACTION_WORKERS processes (1 extracts serially in-process)
+PDF_EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+PDF_PAGES_PER_TASK = 16
+
+# OCR: images are downscaled so a page-wide line of text is at OCR_DPI, binarized,
+# and cut into strips of about OCR_TILE_HEIGHT pixels recognised by OCR_WORKERS
+# processes. PDF pages without a text layer are rendered at OCR_DPI and OCR'd
+# (OCR_PDF_PAGES). Recognised text is cached by image hash
+OCR_DPI = 300
+OCR_TILE_HEIGHT = 2000
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+OCR_PDF_PAGES = True
+OCR_CACHE_PATH = BASE_DIR / 'cache' / 'ocr.sqlite3'
+OCR_CACHE_MAX_ENTRIES = 10000
+
+# Chat model: 'gemini', or 'fake' for deterministic local replies (benchmarks) that
+# take LLM_FAKE_LATENCY seconds to the first token plus LLM_FAKE_TOKEN_LATENCY per token
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+LLM_FAKE_LATENCY = 0.2
+LLM_FAKE_TOKEN_LATENCY = 0.005
+LLM_FAKE_COMPLETION_TOKENS = 60
+
+# LLM gateway: at most LLM_MAX_IN_FLIGHT calls per process at once, LLM_RATE_LIMIT
+# calls per second on average (bursts of LLM_RATE_BURST; 0 disables the limit) and
+# up to LLM_MAX_RETRIES retries of rate-limit, timeout and 5xx errors with jittered
+# exponential backoff starting at LLM_RETRY_BACKOFF seconds
+LLM_MAX_IN_FLIGHT = 8
+LLM_RATE_LIMIT = 5.0
+LLM_RATE_BURST = 10
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF = 0.5
+LLM_RETRY_MAX_BACKOFF = 8.0
+
+# Response cache: answers keyed by normalized question, retrieved context, chat
+# history window and summary, and model settings, reused for RESPONSE_CACHE_TTL
+# seconds. Set a cosine similarity threshold (e.g. 0.95) to also reuse answers to
+# similar questions, compared against the RESPONSE_CACHE_SIMILARITY_CANDIDATES
+# most recent ones in scope. Off unless RESPONSE_CACHE_ENABLED=1.
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '0') == '1'
+RESPONSE_CACHE_PATH = BASE_DIR / 'cache' / 'responses.sqlite3'
+RESPONSE_CACHE_MAX_ENTRIES = 10000
+RESPONSE_CACHE_TTL = 24 * 60 * 60
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = None
+RESPONSE_CACHE_SIMILARITY_CANDIDATES = 200
+
+# Prompt prefix reuse: system prompts keyed by retrieved chunk ids and history
+# summary are kept for PROMPT_CACHE_TTL seconds. PROMPT_CONTEXT_CACHE also uploads
+# them to the provider: 'none', 'gemini' (context caching, for prefixes of at
+# least PROMPT_CONTEXT_CACHE_MIN_TOKENS; PROMPT_CONTEXT_CACHE_MODEL must name a
+# versioned model matching the chat model) or 'fake' (tests with a fake LLM)
+PROMPT_CACHE_MAX_ENTRIES = 256
+PROMPT_CACHE_TTL = 10 * 60
+PROMPT_CONTEXT_CACHE = os.getenv('PROMPT_CONTEXT_CACHE', 'none')
+PROMPT_CONTEXT_CACHE_MODEL = ''
+PROMPT_CONTEXT_CACHE_MIN_TOKENS = 32768
+
+# API pagination: page sizes of the conversations listing and of a conversation's
+# messages (clients may ask for up to API_MAX_PAGE_SIZE with ?limit=), and the
+# characters of the last message shown in the listing
+CONVERSATIONS_PAGE_SIZE = 20
+MESSAGES_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+CONVERSATION_PREVIEW_CHARS = 120
+
+# Chat history: once HISTORY_SUMMARY_MIN_TOKENS of turns have fallen out of the
+# newest HISTORY_MAX_TOKENS (counted with tiktoken) they are folded into the
+# conversation's rolling summary, up to HISTORY_SUMMARY_BATCH_TOKENS per LLM
+# call. Turns not folded yet are sent with each question, up to
+# HISTORY_MAX_TOKENS + HISTORY_SUMMARY_MIN_TOKENS and at most HISTORY_MAX_MESSAGES
+# rows; older rows are folded whatever their size
+HISTORY_MAX_TOKENS = 2000
+HISTORY_MAX_MESSAGES = 50
+HISTORY_TOKEN_ENCODING = 'cl100k_base'
+HISTORY_SUMMARY_MIN_TOKENS = 500
+HISTORY_SUMMARY_BATCH_TOKENS = 2000
+HISTORY_SUMMARY_MAX_WORDS = 250
+HISTORY_SUMMARY_THREADS = 1
+
+# Document ingestion
+# 'thread' ingests uploads in background threads of the web process (development),
+# 'worker' leaves them queued in the database for `python manage.py ingest_worker`
+INGESTION_MODE = os.getenv('INGESTION_MODE', 'thread')
+INGESTION_THREADS = 2
+# Files uploaded together through /api/upload/batch/ are extracted up to
+# INGESTION_BATCH_WORKERS at a time and share vector store writes
+INGESTION_BATCH_WORKERS = 4
+UPLOAD_BATCH_MAX_FILES = 100
+# Resumable uploads (/api/uploads/): files up to UPLOAD_MAX_BYTES are sent in
+# chunks of UPLOAD_CHUNK_BYTES (at most UPLOAD_CHUNK_MAX_BYTES) written straight
+# to MEDIA_ROOT; uploads idle for UPLOAD_SESSION_TTL seconds are discarded
+UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_CHUNK_MAX_BYTES = 32 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+# Django rejects multipart requests carrying more files than this
+DATA_UPLOAD_MAX_NUMBER_FILES = UPLOAD_BATCH_MAX_FILES
+INGESTION_WORKER_PROCESSES = 2
+INGESTION_POLL_INTERVAL = 1.0
+# A document claimed for ingestion that has shown no progress for this many seconds
+# is assumed abandoned by a crashed or stopped worker and queued again
+INGESTION_CLAIM_TIMEOUT = 15 * 60
+# Characters of extracted text kept in Document.processed_content
+DOCUMENT_PREVIEW_CHARS = 10000
+# Chunks and embeddings of ingested files, keyed by content hash, reused when the
+# same file is uploaded again; least recently used entries go past the size cap
+CONTENT_CACHE_PATH = BASE_DIR / 'cache' / 'content'
+CONTENT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
@@ -22,6 +22,6 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ['original_filename', 'file_type', 'conversation', 'uploaded_at']
-    list_filter = ['file_type', 'uploaded_at']
+    list_display = ['original_filename', 'file_type', 'status', 'conversation', 'uploaded_at']
+    list_filter = ['file_type', 'status', 'uploaded_at']
     search_fields = ['original_filename', 'processed_content']
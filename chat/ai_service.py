@@ -1,102 +1,772 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import random
+import threading
+import time
 import uuid
-from typing import List, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.memory import ConversationBufferMemory
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import PyPDF2
-from PIL import Image
-import io
+from .caches import ContentCache, EmbeddingCache, OCRCache, RecentQueryCache, ResponseCache
+from .extraction import iter_pdf_pages
+from .history import count_tokens
+from .metrics import REGISTRY, STAGE_SECONDS, cache_lookup, record_tokens, stage
+from .ocr import OCREngine
+from .prompt_cache import PromptPrefix, PromptPrefixCache, get_context_cache_provider
+from .retrieval import KeywordIndex, hybrid_search, merge_adjacent, trim_to_budget
+from .vector_store import get_chroma_client, get_vector_index
+
+# The LLM, embedding and vector store libraries are imported where their
+# components are first built, so importing this module (and with it the URL
+# conf, e.g. for `manage.py check` or migrations) does not load them.
+
+
+logger = logging.getLogger(__name__)
+
+ERROR_RESPONSE = "I apologize, but I encountered an error while processing your request. Please try again."
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most `size` items"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def split_text_stream(texts: Iterable[str], text_splitter) -> Iterator[str]:
+    """Chunk a stream of text incrementally, carrying the trailing chunk (and its overlap) into the next piece"""
+    carry = ""
+    for text in texts:
+        chunks = text_splitter.split_text(carry + text)
+        if not chunks:
+            continue
+        # The last chunk may continue in the next piece, so it is re-split together with it
+        yield from chunks[:-1]
+        carry = chunks[-1]
+    if carry:
+        yield carry
+
+
+def embed_in_batches(chunks: Iterable[str], embedding_function: Callable, batch_size: int,
+                     workers: int = 1) -> Iterator[Tuple[int, List[str], list]]:
+    """Yield (start_index, batch, embeddings) in order, embedding up to `workers` batches concurrently"""
+    start = 0
+    batches = iter_batches(chunks, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            with stage('embedding'):
+                embeddings = embedding_function(batch)
+            yield start, batch, embeddings
+            start += len(batch)
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Only keep one window of batches in flight so memory stays bounded
+        while True:
+            window = list(islice(batches, workers))
+            if not window:
+                return
+            with stage('embedding'):
+                results = list(executor.map(embedding_function, window))
+            for batch, embeddings in zip(window, results):
+                yield start, batch, embeddings
+                start += len(batch)
+
+
+def write_batches(collection, batches: Iterable[Tuple[int, List[str], list]], document_id: str,
+                  on_batch: Callable[[List[str], list], None] = None, metadata: dict = None,
+                  on_write: Callable[[List[str], List[str]], None] = None) -> int:
+    """
+    Insert (start_index, chunks, embeddings) batches with one Chroma write per batch.
+    on_batch gets each batch's chunks and embeddings, on_write its chunk ids and chunks.
+    """
+    added = 0
+    for start, batch, embeddings in batches:
+        ids = [f"{document_id}_{start + i}" for i in range(len(batch))]
+        with stage('vector_write'):
+            collection.add(
+                documents=batch,
+                embeddings=embeddings,
+                metadatas=[
+                    {**(metadata or {}), "document_id": document_id, "chunk_index": start + i}
+                    for i in range(len(batch))
+                ],
+                ids=ids
+            )
+        if on_write:
+            on_write(ids, batch)
+        if on_batch:
+            on_batch(batch, embeddings)
+        added += len(batch)
+    return added
+
+
+def add_chunks_in_batches(collection, chunks: Iterable[str], document_id: str, embedding_function: Callable,
+                          batch_size: int, workers: int = 1,
+                          on_batch: Callable[[List[str], list], None] = None, metadata: dict = None,
+                          on_write: Callable[[List[str], List[str]], None] = None) -> int:
+    """Embed and insert chunks with one embedding call and one Chroma write per batch"""
+    batches = embed_in_batches(chunks, embedding_function, batch_size, workers)
+    return write_batches(collection, batches, document_id, on_batch, metadata, on_write)
+
+
+def batch_embedded_chunks(embedded_chunks: Iterable[Tuple[str, list]],
+                          batch_size: int) -> Iterator[Tuple[int, List[str], list]]:
+    """Group precomputed (chunk, embedding) pairs into insertable batches"""
+    start = 0
+    for pairs in iter_batches(embedded_chunks, batch_size):
+        yield start, [text for text, _ in pairs], [embedding for _, embedding in pairs]
+        start += len(pairs)
+
+
+class CombinedChunkWriter:
+    """
+    Embeds and inserts the chunks of several documents of one conversation
+    in shared batches.
+
+    Documents are fed concurrently from their own threads with add_document();
+    their chunks are pooled so that small documents (and the tails of large
+    ones) fill common embedding calls and Chroma writes instead of each
+    paying for its own partial batch. Batches are written in the order they
+    fill up, so each document's chunks reach its callbacks in order.
+    """
+
+    def __init__(self, collection, embedding_function: Callable, batch_size: int, metadata: dict = None):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.batch_size = batch_size
+        self.metadata = metadata or {}
+        self.writes = 0
+        self._pending = []
+        self._callbacks = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add_document(self, document_id: str, chunks: Iterable[str],
+                     on_batch: Callable[[List[str], list], None] = None,
+                     on_write: Callable[[List[str], List[str]], None] = None) -> int:
+        """Queue a document's chunks, returning once all of them are written"""
+        with self._lock:
+            self._callbacks[document_id] = (on_batch, on_write)
+        added = 0
+        try:
+            for index, chunk in enumerate(chunks):
+                with self._lock:
+                    self._pending.append((document_id, index, chunk))
+                    full = len(self._pending) >= self.batch_size
+                if full:
+                    self._flush_quietly()
+                added += 1
+            # The document's tail goes out with whatever other documents have pending
+            self._flush_quietly(drain=True)
+        except BaseException:
+            # Extraction failed: other documents' flushes must not write what is left of this one
+            with self._lock:
+                self._pending = [item for item in self._pending if item[0] != document_id]
+            raise
+        finally:
+            with self._lock:
+                error = self._failed.pop(document_id, None)
+                self._callbacks.pop(document_id, None)
+        if error is not None:
+            raise error
+        return added
+
+    def _flush_quietly(self, drain: bool = False):
+        # Errors are recorded against every document in the failed batch and raised from their add_document
+        try:
+            self.flush(drain)
+        except Exception as e:
+            logger.error("Error writing combined batch: %s", e)
+
+    def flush(self, drain: bool = True):
+        """Write full batches, plus the partial remainder if `drain`"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending or (len(self._pending) < self.batch_size and not drain):
+                        return
+                    batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                self._write(batch)
+
+    def _write(self, batch: List[Tuple[str, int, str]]):
+        texts = [text for _, _, text in batch]
+        ids = [f"{document_id}_{index}" for document_id, index, _ in batch]
+        try:
+            with stage('embedding'):
+                embeddings = self.embedding_function(texts)
+            with stage('vector_write'):
+                self.collection.add(
+                    documents=texts,
+                    embeddings=embeddings,
+                    metadatas=[
+                        {**self.metadata, "document_id": document_id, "chunk_index": index}
+                        for document_id, index, _ in batch
+                    ],
+                    ids=ids
+                )
+        except Exception as e:
+            with self._lock:
+                for document_id, _, _ in batch:
+                    # Documents that have already returned from add_document can't be told
+                    if document_id in self._callbacks:
+                        self._failed.setdefault(document_id, e)
+            raise
+        self.writes += 1
+
+        by_document = {}
+        for position, (document_id, _, _) in enumerate(batch):
+            by_document.setdefault(document_id, []).append(position)
+        for document_id, positions in by_document.items():
+            with self._lock:
+                on_batch, on_write = self._callbacks.get(document_id, (None, None))
+            try:
+                if on_write:
+                    on_write([ids[i] for i in positions], [texts[i] for i in positions])
+                if on_batch:
+                    on_batch([texts[i] for i in positions], [embeddings[i] for i in positions])
+            except Exception as e:
+                with self._lock:
+                    if document_id in self._callbacks:
+                        self._failed.setdefault(document_id, e)
+
+
+# HTTP statuses of transient API errors: rate limited, internal error, bad gateway, overloaded, timed out
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """Exception types of transient LLM errors: timeouts, plus rate limits and 5xx from google-api-core clients"""
+    errors = (asyncio.TimeoutError, TimeoutError)
+    try:
+        # Used by langchain-google-genai before it moved to google-genai
+        from google.api_core import exceptions
+    except ImportError:
+        return errors
+    return errors + (
+        exceptions.ResourceExhausted,
+        exceptions.ServiceUnavailable,
+        exceptions.DeadlineExceeded,
+        exceptions.InternalServerError,
+    )
+
+
+@lru_cache(maxsize=None)
+def api_error_types() -> tuple:
+    """Exception types that carry the HTTP status of a failed API call in `code`"""
+    try:
+        # Installed with langchain-google-genai
+        from google.genai.errors import APIError
+    except ImportError:
+        return ()
+    return (APIError,)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM call that failed with `error` is worth retrying"""
+    # LangChain may wrap the client's exception in its own
+    while error is not None:
+        if isinstance(error, retryable_errors()):
+            return True
+        if isinstance(error, api_error_types()) and error.code in RETRYABLE_STATUS_CODES:
+            return True
+        error = error.__cause__
+    return False
+
+
+class AbandonedCall(Exception):
+    """Result of a shared LLM call whose leader was cancelled; the callers waiting on it retry"""
+
+
+class ConcurrencyLimiter:
+    """
+    A semaphore usable from threads and event loops alike, so sync and async
+    callers share one limit. Slots are handed to waiters in arrival order.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self):
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return
+            future = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+            self._waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if wake in self._waiters:
+                    self._waiters.remove(wake)
+                    raise
+            # The slot was handed over just as we were cancelled: pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot goes straight to the next waiter, so in_use is unchanged
+                self._waiters.popleft()()
+            else:
+                self.in_use -= 1
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `burst` calls"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, returning how long to wait before using it"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance is a reservation on tokens that haven't been refilled yet
+            return max(0.0, -self.tokens / self.rate)
+
+
+class LLMGateway:
+    """
+    Front door for every LLM call.
+
+    Limits calls in flight and their rate, retries transient errors (rate
+    limits, timeouts, 5xx) with jittered exponential backoff, and shares one
+    upstream call between identical prompts that are in flight at the same
+    time. Streams are limited and retried (until their first token) but not
+    coalesced.
+    """
+
+    def __init__(self, llm, max_in_flight: int, rate: float, burst: int,
+                 max_retries: int, backoff: float, max_backoff: float):
+        self.llm = llm
+        self.limiter = ConcurrencyLimiter(max_in_flight)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(messages: list, kwargs: dict) -> str:
+        payload = json.dumps(
+            [[(message.type, message.content) for message in messages], sorted(kwargs.items())],
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self.calls += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """The shared future for a prompt, and whether the caller has to produce its result"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        # Unregistered first, so followers that retry an abandoned call start a new one
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _settle(self, key: str, future: Future, call: Callable):
+        try:
+            result = call()
+        except Exception as e:
+            self._finish(key, future, error=e)
+        except BaseException:
+            self._finish(key, future, error=AbandonedCall())
+            raise
+        else:
+            self._finish(key, future, result)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.failures += 1
+            return False
+        with self._lock:
+            self.retries += 1
+        logger.warning("Retrying LLM call after %s: %s", type(error).__name__, error)
+        return True
+
+    def _call(self, messages: list, kwargs: dict):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            # Rate limited callers wait without holding one of the in-flight slots
+            time.sleep(self.bucket.reserve())
+            self.limiter.acquire()
+            try:
+                self._record_wait(time.perf_counter() - start)
+                with stage('llm_call'):
+                    return self.llm.invoke(messages, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self.limiter.release()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def _acall(self, messages: list, kwargs: dict):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.bucket.reserve())
+            await self.limiter.aacquire()
+            try:
+                self._record_wait(time.perf_counter() - start)
+                with stage('llm_call'):
+                    return await self.llm.ainvoke(messages, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    def invoke(self, messages: list, **kwargs):
+        key = self.key(messages, kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                self._settle(key, future, lambda: self._call(messages, kwargs))
+            try:
+                return future.result()
+            except AbandonedCall:
+                # The leader went away; make the call or follow whoever does
+                continue
+
+    async def ainvoke(self, messages: list, **kwargs):
+        key = self.key(messages, kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = await self._acall(messages, kwargs)
+                except asyncio.CancelledError:
+                    # The leader's client disconnected: followers retry instead of being cancelled too
+                    self._finish(key, future, error=AbandonedCall())
+                    raise
+                except Exception as e:
+                    self._finish(key, future, error=e)
+                else:
+                    self._finish(key, future, result)
+            try:
+                # Shielded so a follower's own cancellation doesn't cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except AbandonedCall:
+                continue
+
+    async def astream(self, messages: list, **kwargs) -> AsyncIterator:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.bucket.reserve())
+            await self.limiter.aacquire()
+            streamed = False
+            try:
+                self._record_wait(time.perf_counter() - start)
+                with stage('llm_stream'):
+                    async for chunk in self.llm.astream(messages, **kwargs):
+                        if not streamed:
+                            STAGE_SECONDS.observe(time.perf_counter() - start, stage='llm_first_token')
+                        streamed = True
+                        yield chunk
+                return
+            except Exception as e:
+                # Once tokens have reached the client the stream can't be replayed
+                if streamed or not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': self.limiter.in_use,
+                'queue_depth': self.limiter.waiting,
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'retries': self.retries,
+                'failures': self.failures,
+                'avg_wait_ms': round(self.total_wait / self.calls * 1000, 2) if self.calls else None,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+            }
+
+
+class lazy_component:
+    """
+    Like functools.cached_property, but built only once even when several
+    threads ask for it at the same time.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+        with self.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.build(instance)
+            return instance.__dict__[self.name]
 
 
 class AIService:
+    """
+    Chat, retrieval and ingestion operations.
+
+    Creating the service is cheap: each heavy component (LLM client, Chroma
+    client, embedding model, caches) is built on first use, once per process,
+    or all at once by warmup().
+    """
+
+    chunk_size = 1000
+    chunk_overlap = 200
+
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=settings.GEMINI_API_KEY,
-            temperature=0.7
+        self.embedding_workers = max(1, settings.VECTORDB_EMBEDDING_WORKERS)
+
+    @lazy_component
+    def llm(self):
+        from .llms import get_chat_model
+        return get_chat_model()
+
+    @lazy_component
+    def llm_gateway(self):
+        """Concurrency and rate limits, retries and coalescing in front of the LLM"""
+        return LLMGateway(
+            self.llm,
+            settings.LLM_MAX_IN_FLIGHT,
+            settings.LLM_RATE_LIMIT,
+            settings.LLM_RATE_BURST,
+            settings.LLM_MAX_RETRIES,
+            settings.LLM_RETRY_BACKOFF,
+            settings.LLM_RETRY_MAX_BACKOFF
         )
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=settings.GEMINI_API_KEY
+
+    @lazy_component
+    def chroma_client(self):
+        """ChromaDB, in-process or through the shared vector store server"""
+        return get_chroma_client()
+
+    @lazy_component
+    def embedding_provider(self):
+        from .embeddings import get_embedding_provider
+        return get_embedding_provider()
+
+    @lazy_component
+    def embedding_cache(self):
+        return EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+
+    @lazy_component
+    def embedding_function(self):
+        """
+        Embeddings are computed explicitly so inserts can be batched and parallelised,
+        and go through a persistent cache shared by ingestion and retrieval
+        """
+        from .embeddings import CachedEmbeddingFunction
+        return CachedEmbeddingFunction(self.embedding_provider, self.embedding_cache)
+
+    @lazy_component
+    def vector_index(self):
+        return get_vector_index(
+            self.chroma_client, self.embedding_function,
+            settings.VECTORDB_INDEX_MODE, settings.VECTORDB_SHARDS,
+            settings.VECTORDB_HANDLE_CACHE_SIZE
         )
-        self.vectordb_path = settings.VECTORDB_PATH
-        self.vectordb_path.mkdir(exist_ok=True)
-        
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(self.vectordb_path),
-            settings=Settings(anonymized_telemetry=False)
+
+    @lazy_component
+    def query_cache(self):
+        """Recent retrieval results, so several questions in a row skip repeated index lookups"""
+        return RecentQueryCache(settings.RETRIEVAL_CACHE_MAX_ENTRIES, settings.RETRIEVAL_CACHE_TTL)
+
+    @lazy_component
+    def keyword_index(self):
+        """BM25 index of the same chunks, searched alongside the vectors"""
+        return KeywordIndex(settings.KEYWORD_INDEX_PATH) if settings.RETRIEVAL_HYBRID else None
+
+    @lazy_component
+    def content_cache(self):
+        """Chunks and embeddings of ingested PDFs, reused when the same file is uploaded again"""
+        return ContentCache(settings.CONTENT_CACHE_PATH, settings.CONTENT_CACHE_MAX_BYTES)
+
+    @lazy_component
+    def ocr_engine(self):
+        """Image preprocessing, tiling and OCR across a process pool, cached by image hash"""
+        return OCREngine(
+            settings.OCR_DPI,
+            settings.OCR_TILE_HEIGHT,
+            settings.OCR_WORKERS,
+            settings.OCR_LANG,
+            OCRCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_MAX_ENTRIES)
         )
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+
+    @lazy_component
+    def batch_size(self):
+        return max(1, min(settings.VECTORDB_BATCH_SIZE, self.chroma_client.get_max_batch_size()))
+
+    @lazy_component
+    def text_splitter(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
         )
-        
-        self.memory = ConversationBufferMemory(
+
+    @lazy_component
+    def memory(self):
+        from langchain.memory import ConversationBufferMemory
+        return ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
         )
 
+    @lazy_component
+    def prompt_cache(self):
+        """System prompts are reused while a conversation keeps retrieving the same chunks"""
+        return PromptPrefixCache(
+            settings.PROMPT_CACHE_MAX_ENTRIES,
+            settings.PROMPT_CACHE_TTL,
+            get_context_cache_provider(model=self.llm.model)
+        )
+
+    @lazy_component
+    def response_cache(self):
+        """Answers to repeated questions over the same context are served without an LLM call"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        return ResponseCache(
+            settings.RESPONSE_CACHE_PATH,
+            settings.RESPONSE_CACHE_MAX_ENTRIES,
+            settings.RESPONSE_CACHE_TTL,
+            settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+            settings.RESPONSE_CACHE_SIMILARITY_CANDIDATES
+        )
+
+    def warmup(self) -> float:
+        """Build every component (and load the embedding model) ahead of the first request"""
+        start = time.perf_counter()
+        for name in ('llm_gateway', 'text_splitter', 'embedding_function', 'vector_index', 'keyword_index',
+                     'batch_size',
+                     'prompt_cache', 'response_cache'):
+            try:
+                getattr(self, name)
+            except Exception as e:
+                logger.warning("Could not initialize %s: %s", name, e)
+        if settings.EMBEDDING_WARMUP:
+            self.warmup_embeddings()
+        elapsed = time.perf_counter() - start
+        logger.info("AI service warmed up in %.0f ms", elapsed * 1000)
+        return elapsed
+
+    def warmup_embeddings(self):
+        """Load the embedding model up front so the first upload or question doesn't pay for it"""
+        try:
+            elapsed = self.embedding_provider.warmup()
+            logger.info("Embedding provider %s warmed up in %.0f ms", self.embedding_provider.MODEL_NAME, elapsed * 1000)
+        except Exception as e:
+            logger.warning("Embedding provider warm-up failed: %s", e)
+
+    def iter_pdf_text(self, file_path: str) -> Iterator[str]:
+        """Yield the text of each non-empty PDF page as it is extracted"""
+        pages = iter_pdf_pages(
+            file_path,
+            workers=settings.PDF_EXTRACTION_WORKERS,
+            pages_per_task=settings.PDF_PAGES_PER_TASK,
+            ocr_dpi=settings.OCR_DPI if settings.OCR_PDF_PAGES else 0,
+            ocr_lang=settings.OCR_LANG
+        )
+        for page_num, page_text in pages:
+            # Only add non-empty pages
+            if page_text.strip():
+                yield f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+
     def process_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
         try:
-            # Try pdfplumber first (better text extraction)
-            try:
-                import pdfplumber
-                text = ""
-                with pdfplumber.open(file_path) as pdf:
-                    print(f"PDF has {len(pdf.pages)} pages (using pdfplumber)")
-                    for page_num, page in enumerate(pdf.pages):
-                        try:
-                            page_text = page.extract_text()
-                            if page_text and page_text.strip():
-                                text += f"\n--- Page {page_num + 1} ---\n"
-                                text += page_text + "\n"
-                                print(f"Extracted {len(page_text)} characters from page {page_num + 1}")
-                        except Exception as page_error:
-                            print(f"Error extracting page {page_num + 1}: {page_error}")
-                            continue
-                
-                if text.strip():
-                    print(f"Total extracted text length: {len(text)} characters (pdfplumber)")
-                    return text
-                else:
-                    print("pdfplumber extracted no text, trying PyPDF2...")
-            except ImportError:
-                print("pdfplumber not available, using PyPDF2...")
-            except Exception as e:
-                print(f"pdfplumber failed: {e}, trying PyPDF2...")
-            
-            # Fallback to PyPDF2
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                print(f"PDF has {len(pdf_reader.pages)} pages (using PyPDF2)")
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():  # Only add non-empty pages
-                            text += f"\n--- Page {page_num + 1} ---\n"
-                            text += page_text + "\n"
-                            print(f"Extracted {len(page_text)} characters from page {page_num + 1}")
-                    except Exception as page_error:
-                        print(f"Error extracting page {page_num + 1}: {page_error}")
-                        continue
-                
-                print(f"Total extracted text length: {len(text)} characters (PyPDF2)")
-                return text
+            text = "".join(self.iter_pdf_text(file_path))
+            logger.debug("Extracted %d characters from %s", len(text), file_path)
+            return text
                 
         except Exception as e:
-            print(f"Error processing PDF: {e}")
+            logger.error("Error processing PDF %s: %s", file_path, e)
             return ""
 
     def process_image(self, file_path: str) -> str:
@@ -112,23 +782,19 @@ class AIService:
                 mode = img.mode
                 format_name = img.format
                 file_size = os.path.getsize(file_path)
-                
-                # Try to extract text using OCR
-                extracted_text = ""
-                try:
-                    import pytesseract
-                    # Convert to RGB if necessary
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    extracted_text = pytesseract.image_to_string(img)
-                    extracted_text = extracted_text.strip()
-                except ImportError:
-                    extracted_text = "OCR not available (pytesseract not installed)"
-                except Exception as ocr_error:
-                    extracted_text = f"OCR failed: {str(ocr_error)}"
-                
-                # Create a description of the image
-                image_description = f"""
+
+            # Try to extract text using OCR
+            extracted_text = ""
+            try:
+                with stage('ocr'):
+                    extracted_text = self.ocr_engine.image_to_text(file_path)
+            except ImportError:
+                extracted_text = "OCR not available (pytesseract not installed)"
+            except Exception as ocr_error:
+                extracted_text = f"OCR failed: {str(ocr_error)}"
+            
+            # Create a description of the image
+            image_description = f"""
 Image Analysis:
 - Filename: {os.path.basename(file_path)}
 - Dimensions: {width}x{height} pixels
@@ -141,120 +807,446 @@ Extracted Text:
 
 Note: This is a visual image file. The AI can discuss the image based on its filename, metadata, and any extracted text content.
 """
-                
-                return image_description
-                
+            
+            return image_description
+
         except Exception as e:
-            print(f"Error processing image: {e}")
+            logger.error("Error processing image %s: %s", file_path, e)
             return f"Image file: {os.path.basename(file_path)} (processing error: {str(e)})"
 
-    def add_document_to_vectordb(self, content: str, document_id: str, conversation_id: str):
-        """Add document content to vector database"""
+    @property
+    def embedding_model_name(self) -> str:
+        """Identifies the embedding model, so cached vectors are never mixed across models"""
+        return getattr(self.embedding_function, 'MODEL_NAME', type(self.embedding_function).__name__)
+
+    @property
+    def ingestion_fingerprint(self) -> str:
+        """Short hash of everything that shapes a document's chunks and vectors"""
+        # OCR settings change the text of scanned pages
+        ocr = f"{settings.OCR_DPI}-{settings.OCR_LANG}" if settings.OCR_PDF_PAGES else "no-ocr"
+        config = f"{self.embedding_model_name}|{self.chunk_size}|{self.chunk_overlap}|{ocr}"
+        return hashlib.sha256(config.encode()).hexdigest()[:12]
+
+    def _chunk_writer(self, document_id: str, conversation_id: str) -> Callable[[List[str], List[str]], None]:
+        """Callback run for every batch written to a conversation"""
+        def on_write(chunk_ids: List[str], chunks: List[str]):
+            if self.keyword_index is not None:
+                try:
+                    self.keyword_index.add(conversation_id, document_id, chunk_ids, chunks)
+                except Exception:
+                    # The chunks are in the vector store already; they stay reachable by vector search
+                    logger.exception("Error adding chunks of document %s to the keyword index", document_id)
+            # Earlier retrieval results may now be missing these chunks
+            self.query_cache.invalidate(conversation_id)
+        return on_write
+
+    def combined_writer(self, conversation_id: str) -> CombinedChunkWriter:
+        """Writer pooling the chunks of several documents of a conversation into shared batches"""
+        return CombinedChunkWriter(
+            self.vector_index.collection_for(conversation_id), self.embedding_function,
+            self.batch_size, self.vector_index.chunk_metadata(conversation_id)
+        )
+
+    def add_texts_to_vectordb(self, texts: Iterable[str], document_id: str, conversation_id: str,
+                              on_batch: Callable[[List[str], list], None] = None,
+                              combined: Optional[CombinedChunkWriter] = None) -> int:
+        """
+        Chunk a stream of document text and write it to the vector database in
+        bounded batches, shared with other documents if a combined writer is given
+        """
         try:
-            print(f"Adding document to vectordb: {document_id} for conversation: {conversation_id}")
-            print(f"Content length: {len(content)} characters")
-            
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(content)
-            print(f"Split into {len(chunks)} chunks")
-            
-            # Create collection for this conversation
-            collection_name = f"conversation_{conversation_id}"
-            
-            # Get or create collection
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-                print(f"Using existing collection: {collection_name}")
-            except:
-                collection = self.chroma_client.create_collection(collection_name)
-                print(f"Created new collection: {collection_name}")
-            
-            # Add chunks to collection
-            for i, chunk in enumerate(chunks):
-                collection.add(
-                    documents=[chunk],
-                    metadatas=[{"document_id": document_id, "chunk_index": i}],
-                    ids=[f"{document_id}_{i}"]
+            logger.debug("Adding document %s of conversation %s to the vector store", document_id, conversation_id)
+            # Chunks are produced, embedded and inserted as the text streams in
+            chunks = split_text_stream(texts, self.text_splitter)
+            if combined is not None:
+                added = combined.add_document(
+                    document_id, chunks, on_batch, self._chunk_writer(document_id, conversation_id)
                 )
-                print(f"Added chunk {i+1}/{len(chunks)}")
+                logger.info("Added %d chunks of document %s to the vector store", added, document_id)
+                return added
+
+            collection = self.vector_index.collection_for(conversation_id)
+            added = add_chunks_in_batches(
+                collection, chunks, document_id, self.embedding_function,
+                self.batch_size, self.embedding_workers, on_batch,
+                self.vector_index.chunk_metadata(conversation_id),
+                self._chunk_writer(document_id, conversation_id)
+            )
             
-            print(f"Successfully added document {document_id} to vectordb")
+            logger.info("Added %d chunks of document %s to the vector store", added, document_id)
+            return added
                 
         except Exception as e:
-            print(f"Error adding document to vectordb: {e}")
+            logger.error("Error adding document %s to the vector store: %s", document_id, e)
+            raise
 
-    def get_conversation_context(self, conversation_id: str, query: str) -> str:
-        """Retrieve relevant context from vector database"""
+    def add_embedded_chunks_to_vectordb(self, embedded_chunks: Iterable[Tuple[str, list]],
+                                        document_id: str, conversation_id: str) -> int:
+        """Write chunks whose embeddings are already known, skipping the embedding step"""
+        collection = self.vector_index.collection_for(conversation_id)
+        added = write_batches(
+            collection, batch_embedded_chunks(embedded_chunks, self.batch_size), document_id,
+            metadata=self.vector_index.chunk_metadata(conversation_id),
+            on_write=self._chunk_writer(document_id, conversation_id)
+        )
+        logger.info("Added %d precomputed chunks of document %s to the vector store", added, document_id)
+        return added
+
+    def add_document_to_vectordb(self, content: str, document_id: str, conversation_id: str) -> int:
+        """Add document content to vector database"""
+        return self.add_texts_to_vectordb([content], document_id, conversation_id)
+
+    def retrieve_context(self, conversation_id: str, query: str,
+                         document_ids: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+        """Retrieve relevant context and the ids of the chunks it was built from"""
+        if document_ids is not None and not document_ids:
+            # Nothing has finished ingesting yet, so there is nothing to retrieve
+            return "", []
+        
+        # The ready documents are part of the key, so a document finishing
+        # ingestion in another process also yields fresh results
+        key = (query, tuple(document_ids) if document_ids is not None else None)
+        cached, stamp = self.query_cache.get(conversation_id, key)
+        cache_lookup('retrieval', cached is not None)
+        if cached is not None:
+            logger.debug("Using recent retrieval results of conversation %s", conversation_id)
+            return cached
+        
         try:
-            collection_name = f"conversation_{conversation_id}"
-            print(f"Looking for context in collection: {collection_name}")
-            
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-                print(f"Collection found, querying with: {query}")
-                
-                results = collection.query(
-                    query_texts=[query],
-                    n_results=5
-                )
-                
-                print(f"Query results: {results}")
-                
-                if results['documents'] and results['documents'][0]:
-                    context = "\n".join(results['documents'][0])
-                    print(f"Retrieved context: {context[:200]}...")
-                    return context
-                else:
-                    print("No documents found in results")
-                    return ""
-            except Exception as e:
-                print(f"Error querying collection: {e}")
-                return ""
-                
+            with stage('retrieval'):
+                result = self._search_context(conversation_id, query, document_ids)
         except Exception as e:
-            print(f"Error retrieving context: {e}")
-            return ""
+            logger.error("Error retrieving context of conversation %s: %s", conversation_id, e)
+            # The cached handle may point at a collection deleted by another process
+            self.vector_index.forget(conversation_id)
+            return "", []
+        self.query_cache.set(conversation_id, key, result, stamp)
+        return result
+
+    def _search_context(self, conversation_id: str, query: str,
+                        document_ids: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+        collection = self.vector_index.find_collection(conversation_id)
+        if collection is None:
+            logger.debug("No documents stored for conversation %s", conversation_id)
+            return "", []
+        
+        # Embed through the cache so repeated questions skip the model
+        with stage('embed_query'):
+            query_embedding = self.embedding_function.embed_query(query)
+        with stage('search'):
+            ranked_ids, texts = hybrid_search(
+                collection, query_embedding,
+                self.vector_index.where(conversation_id, document_ids),
+                self.keyword_index, conversation_id, query, document_ids,
+                settings.RETRIEVAL_CANDIDATES, settings.RETRIEVAL_RRF_K
+            )
+        
+        if not ranked_ids:
+            logger.debug("No chunks matched in conversation %s", conversation_id)
+            return "", []
+        
+        # Neighbouring chunks are merged so their shared overlap is sent once
+        passages = merge_adjacent(
+            ranked_ids[:settings.RETRIEVAL_MAX_CHUNKS], texts, self.chunk_overlap
+        )
+        passages = trim_to_budget(passages, settings.RETRIEVAL_MAX_TOKENS)
+        context = "\n\n".join(text for _, text in passages)
+        chunk_ids = [chunk_id for members, _ in passages for chunk_id in members]
+        logger.debug("Retrieved %d chunks in %d passages for conversation %s",
+                     len(chunk_ids), len(passages), conversation_id)
+        return context, chunk_ids
 
-    def generate_response(self, message: str, conversation_id: str, chat_history: List[dict] = None) -> str:
+    def get_conversation_context(self, conversation_id: str, query: str, document_ids: Optional[List[str]] = None) -> str:
+        """Retrieve relevant context from vector database, optionally restricted to the given documents"""
+        return self.retrieve_context(conversation_id, query, document_ids)[0]
+
+    def delete_conversation_vectors(self, conversation_id: str):
+        """Remove every chunk stored for a conversation"""
+        self.query_cache.invalidate(conversation_id)
+        try:
+            self.vector_index.delete_conversation(conversation_id)
+            if self.keyword_index is not None:
+                self.keyword_index.delete_conversation(conversation_id)
+        except Exception as e:
+            logger.error("Error deleting vectors of conversation %s: %s", conversation_id, e)
+
+    async def aprocess_pdf(self, file_path: str) -> str:
+        """Async variant of process_pdf, run in a worker thread"""
+        return await sync_to_async(self.process_pdf, thread_sensitive=False)(file_path)
+
+    async def aprocess_image(self, file_path: str) -> str:
+        """Async variant of process_image, run in a worker thread"""
+        return await sync_to_async(self.process_image, thread_sensitive=False)(file_path)
+
+    async def aadd_document_to_vectordb(self, content: str, document_id: str, conversation_id: str):
+        """Async variant of add_document_to_vectordb, run in a worker thread"""
+        await sync_to_async(self.add_document_to_vectordb, thread_sensitive=False)(
+            content, document_id, conversation_id
+        )
+
+    async def adelete_conversation_vectors(self, conversation_id: str):
+        """Async variant of delete_conversation_vectors, run in a worker thread"""
+        await sync_to_async(self.delete_conversation_vectors, thread_sensitive=False)(conversation_id)
+
+    async def aget_conversation_context(self, conversation_id: str, query: str, document_ids: Optional[List[str]] = None) -> str:
+        """Async variant of get_conversation_context, run in a worker thread"""
+        return await sync_to_async(self.get_conversation_context, thread_sensitive=False)(
+            conversation_id, query, document_ids
+        )
+
+    async def aretrieve_context(self, conversation_id: str, query: str,
+                                document_ids: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+        """Async variant of retrieve_context, run in a worker thread"""
+        return await sync_to_async(self.retrieve_context, thread_sensitive=False)(
+            conversation_id, query, document_ids
+        )
+
+    def _system_prompt(self, context: str, history_summary: str = "") -> str:
+        """Assemble the system prompt from the retrieved context and the summary of earlier turns"""
+        system_prompt = """You are a helpful AI assistant. You can help users with questions and provide information based on the context provided. 
+        If you have access to uploaded documents, use that information to answer questions. 
+        For image files, you can discuss the filename, metadata, and general information about the image, but explain that you cannot see the actual visual content.
+        When users ask about uploaded files, you have access to the content and can provide detailed information about them.
+        Be helpful, accurate, and concise in your responses."""
+        
+        if context:
+            system_prompt += f"\n\nRelevant context from uploaded documents:\n{context}"
+        else:
+            system_prompt += "\n\nNote: No specific document context was found for this query."
+        
+        if history_summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{history_summary}"
+        return system_prompt
+
+    def prompt_prefix(self, context: str, chunk_ids: List[str], history_summary: str = "") -> PromptPrefix:
+        """System prompt for the turn, reused from an earlier turn that retrieved the same chunks"""
+        return self.prompt_cache.get(
+            chunk_ids, history_summary, lambda: self._system_prompt(context, history_summary)
+        )
+
+    async def aprompt_prefix(self, context: str, chunk_ids: List[str], history_summary: str = "") -> PromptPrefix:
+        """Async variant of prompt_prefix, run in a worker thread (it may upload a provider-side cache)"""
+        return await sync_to_async(self.prompt_prefix, thread_sensitive=False)(
+            context, chunk_ids, history_summary
+        )
+
+    def _build_messages(self, message: str, prefix: PromptPrefix, chat_history: List[dict] = None) -> list:
+        """Assemble the system prompt and chat history for the LLM"""
+        from langchain_core.messages import AIMessage, HumanMessage
+        
+        # A prefix held in a provider-side cache is referenced by the call instead of sent
+        messages = [] if prefix.cached_content else [prefix.system_message]
+        
+        # Add chat history
+        if chat_history:
+            for msg in chat_history:
+                if msg['message_type'] == 'user':
+                    messages.append(HumanMessage(content=msg['content']))
+                elif msg['message_type'] == 'assistant':
+                    messages.append(AIMessage(content=msg['content']))
+        
+        # Add current user message
+        messages.append(HumanMessage(content=message))
+        return messages
+
+    def _response_scope(self, context: str, chat_history: List[dict] = None, history_summary: str = "") -> str:
+        """
+        Cache scope of an answer: the retrieved context, the conversation so far and
+        everything else that shapes the model's output. Follow-ups such as "tell me
+        more" only match an answer given after the same history.
+        """
+        model_settings = f"{self.llm.model}|{self.llm.temperature}|{self.embedding_model_name}"
+        conversation = json.dumps(
+            [history_summary, [(msg['message_type'], msg['content']) for msg in chat_history or []]]
+        )
+        return ResponseCache.scope(context, model_settings, conversation)
+
+    def get_cached_response(self, message: str, context: str, chat_history: List[dict] = None,
+                            history_summary: str = "") -> Optional[str]:
+        """Previous answer to the same (or, if enabled, a similar) question over the same context and history"""
+        if self.response_cache is None:
+            return None
+        try:
+            cached = self.response_cache.get(
+                self._response_scope(context, chat_history, history_summary), message,
+                lambda: self.embedding_function.embed_query(message)
+            )
+        except Exception as e:
+            logger.error("Error reading response cache: %s", e)
+            return None
+        cache_lookup('response', cached is not None)
+        return cached
+
+    def cache_response(self, message: str, context: str, response: str, chat_history: List[dict] = None,
+                       history_summary: str = ""):
+        if self.response_cache is None or not response or response == ERROR_RESPONSE:
+            return
+        try:
+            vector = None
+            if self.response_cache.similarity_threshold is not None:
+                vector = self.embedding_function.embed_query(message)
+            self.response_cache.set(
+                self._response_scope(context, chat_history, history_summary), message, response, vector
+            )
+        except Exception as e:
+            logger.error("Error writing response cache: %s", e)
+
+    async def aget_cached_response(self, message: str, context: str, chat_history: List[dict] = None,
+                                   history_summary: str = "") -> Optional[str]:
+        """Async variant of get_cached_response, run in a worker thread"""
+        return await sync_to_async(self.get_cached_response, thread_sensitive=False)(
+            message, context, chat_history, history_summary
+        )
+
+    async def acache_response(self, message: str, context: str, response: str, chat_history: List[dict] = None,
+                              history_summary: str = ""):
+        """Async variant of cache_response, run in a worker thread"""
+        await sync_to_async(self.cache_response, thread_sensitive=False)(
+            message, context, response, chat_history, history_summary
+        )
+
+    def generate_response(self, message: str, conversation_id: str, chat_history: List[dict] = None,
+                          document_ids: Optional[List[str]] = None, history_summary: str = "") -> str:
         """Generate AI response using Gemini"""
         try:
             # Get relevant context from documents
-            context = self.get_conversation_context(conversation_id, message)
+            context, chunk_ids = self.retrieve_context(conversation_id, message, document_ids)
+            cached = self.get_cached_response(message, context, chat_history, history_summary)
+            if cached is not None:
+                return cached
+            with stage('prompt_assembly'):
+                prefix = self.prompt_prefix(context, chunk_ids, history_summary)
+                messages = self._build_messages(message, prefix, chat_history)
             
-            # Prepare system message with context
-            system_prompt = """You are a helpful AI assistant. You can help users with questions and provide information based on the context provided. 
-            If you have access to uploaded documents, use that information to answer questions. 
-            For image files, you can discuss the filename, metadata, and general information about the image, but explain that you cannot see the actual visual content.
-            When users ask about uploaded files, you have access to the content and can provide detailed information about them.
-            Be helpful, accurate, and concise in your responses."""
-            
-            if context:
-                system_prompt += f"\n\nRelevant context from uploaded documents:\n{context}"
-            else:
-                system_prompt += "\n\nNote: No specific document context was found for this query."
-            
-            # Prepare messages
-            messages = [SystemMessage(content=system_prompt)]
-            
-            # Add chat history
-            if chat_history:
-                for msg in chat_history:
-                    if msg['message_type'] == 'user':
-                        messages.append(HumanMessage(content=msg['content']))
-                    elif msg['message_type'] == 'assistant':
-                        messages.append(AIMessage(content=msg['content']))
+            # Generate response
+            response = self.llm_gateway.invoke(messages, **prefix.llm_kwargs)
+            self._record_usage(prefix, messages, response.content, response)
+            self.cache_response(message, context, response.content, chat_history, history_summary)
+            return response.content
             
-            # Add current user message
-            messages.append(HumanMessage(content=message))
+        except Exception:
+            logger.exception("Error generating response")
+            return ERROR_RESPONSE
+
+    async def agenerate_response(self, message: str, conversation_id: str, chat_history: List[dict] = None,
+                                 document_ids: Optional[List[str]] = None, history_summary: str = "") -> str:
+        """Generate AI response using Gemini without blocking the event loop"""
+        try:
+            context, chunk_ids = await self.aretrieve_context(conversation_id, message, document_ids)
+            cached = await self.aget_cached_response(message, context, chat_history, history_summary)
+            if cached is not None:
+                return cached
+            with stage('prompt_assembly'):
+                prefix = await self.aprompt_prefix(context, chunk_ids, history_summary)
+                messages = self._build_messages(message, prefix, chat_history)
             
-            # Generate response
-            response = self.llm.invoke(messages)
+            response = await self.llm_gateway.ainvoke(messages, **prefix.llm_kwargs)
+            self._record_usage(prefix, messages, response.content, response)
+            await self.acache_response(message, context, response.content, chat_history, history_summary)
             return response.content
             
-        except Exception as e:
-            print(f"Error generating response: {e}")
-            return "I apologize, but I encountered an error while processing your request. Please try again."
+        except Exception:
+            logger.exception("Error generating response")
+            return ERROR_RESPONSE
+
+    async def astream_response(self, message: str, conversation_id: str, chat_history: List[dict] = None,
+                               document_ids: Optional[List[str]] = None,
+                               history_summary: str = "") -> AsyncIterator[str]:
+        """Stream the AI response token by token as Gemini produces it"""
+        streamed_any = False
+        try:
+            context, chunk_ids = await self.aretrieve_context(conversation_id, message, document_ids)
+            cached = await self.aget_cached_response(message, context, chat_history, history_summary)
+            if cached is not None:
+                streamed_any = True
+                yield cached
+                return
+            with stage('prompt_assembly'):
+                prefix = await self.aprompt_prefix(context, chunk_ids, history_summary)
+                messages = self._build_messages(message, prefix, chat_history)
+            
+            tokens = []
+            async for chunk in self.llm_gateway.astream(messages, **prefix.llm_kwargs):
+                if chunk.content:
+                    streamed_any = True
+                    tokens.append(chunk.content)
+                    yield chunk.content
+            self._record_usage(prefix, messages, "".join(tokens))
+            await self.acache_response(message, context, "".join(tokens), chat_history, history_summary)
+                    
+        except Exception:
+            logger.exception("Error streaming response")
+            if not streamed_any:
+                yield ERROR_RESPONSE
+
+    def _record_usage(self, prefix: PromptPrefix, messages: list, completion: str, response=None):
+        """Token counts of an LLM request, as reported by the provider or else estimated"""
+        usage = getattr(response, 'usage_metadata', None) or {}
+        prompt_tokens = usage.get('input_tokens')
+        if prompt_tokens is None:
+            # A prefix in a provider-side cache is still billed as input
+            prompt_messages = messages if not prefix.cached_content else [prefix.system_message, *messages]
+            prompt_tokens = sum(count_tokens(str(m.content)) for m in prompt_messages)
+        completion_tokens = usage.get('output_tokens')
+        if completion_tokens is None:
+            completion_tokens = count_tokens(completion)
+        record_tokens(prompt_tokens, completion_tokens)
+
+    def metric_samples(self) -> list:
+        """LLM gateway gauges and counters, read when /metrics is scraped"""
+        if 'llm_gateway' not in self.__dict__:
+            return []
+        stats = self.llm_gateway.stats()
+        return [
+            ('aichat_llm_in_flight', 'gauge', 'LLM calls running', {}, stats['in_flight']),
+            ('aichat_llm_queue_depth', 'gauge', 'LLM calls waiting for a slot', {}, stats['queue_depth']),
+            ('aichat_llm_calls_total', 'counter', 'LLM calls made by the gateway', {}, stats['calls']),
+            ('aichat_llm_coalesced_total', 'counter', 'Requests served by an identical call in flight', {},
+             stats['coalesced']),
+            ('aichat_llm_retries_total', 'counter', 'Retried LLM calls', {}, stats['retries']),
+            ('aichat_llm_failures_total', 'counter', 'LLM calls that failed for good', {}, stats['failures']),
+        ]
+
+    def stats(self) -> dict:
+        """Counters of the LLM gateway and of the caches built so far"""
+        built = self.__dict__
+        return {
+            'llm': built['llm_gateway'].stats() if 'llm_gateway' in built else None,
+            'response_cache': built['response_cache'].stats() if built.get('response_cache') else None,
+            'prompt_cache': built['prompt_cache'].stats() if 'prompt_cache' in built else None,
+            'query_cache': built['query_cache'].stats() if 'query_cache' in built else None,
+        }
+
+    def summarize_history(self, previous_summary: str, messages: List[dict]) -> str:
+        """Fold older chat turns into the conversation's rolling summary"""
+        from langchain_core.messages import HumanMessage
+        transcript = "\n".join(
+            f"{'User' if msg['message_type'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in messages
+        )
+        prompt = (
+            f"Update the summary of a conversation between a user and an AI assistant with the new turns below. "
+            f"Keep facts, names, decisions and open questions the assistant may need later. "
+            f"Answer with the updated summary only, in at most {settings.HISTORY_SUMMARY_MAX_WORDS} words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        return self.llm_gateway.invoke([HumanMessage(content=prompt)]).content.strip()
 
     def create_conversation(self) -> str:
         """Create a new conversation session"""
         return str(uuid.uuid4())
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """The process-wide AIService shared by views, background threads and workers"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AIService()
+                REGISTRY.add_collector(_service.metric_samples)
+    return _service
@@ -1,6 +1,21 @@
+import threading
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        if settings.INGESTION_MODE == 'thread':
+            # Pick up documents an earlier web process left unfinished, once serving
+            # requests (and never during migrate or other management commands)
+            from django.core.signals import request_started
+            from .ingestion import RESUME_DISPATCH_UID, resume_pending_documents
+            request_started.connect(resume_pending_documents, dispatch_uid=RESUME_DISPATCH_UID)
+
+        if settings.AI_SERVICE_PREWARM:
+            # Warm up in the background so the server starts accepting requests right away
+            from .ai_service import get_ai_service
+            threading.Thread(target=get_ai_service().warmup, name='ai-service-warmup', daemon=True).start()
@@ -0,0 +1,119 @@
+"""
+Helpers shared by the ``benchmark_*`` management commands.
+"""
+import io
+import random
+import textwrap
+import time
+from pathlib import Path
+from typing import List
+
+
+WORDS = (
+    "invoice contract clause payment delivery warranty liability customer supplier "
+    "schedule report summary analysis revenue quarter budget policy section appendix "
+    "agreement service term notice period amount total balance account reference"
+).split()
+
+
+def _random_text(rng: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def synthetic_document(pages: int = 300, chars_per_page: int = 2500, seed: int = 0) -> str:
+    """Build text shaped like process_pdf output for a document with the given number of pages"""
+    rng = random.Random(seed)
+    return "".join(
+        f"\n--- Page {page_num + 1} ---\n{_random_text(rng, chars_per_page)}\n"
+        for page_num in range(pages)
+    )
+
+
+def synthetic_chunks(count: int, chars: int = 1000, seed: int = 0) -> List[str]:
+    """Independent chunk-sized texts"""
+    rng = random.Random(seed)
+    return [_random_text(rng, chars) for _ in range(count)]
+
+
+def synthetic_pdf(pages: int = 5, chars_per_page: int = 2500, seed: int = 0) -> bytes:
+    """A PDF with a text layer (Helvetica, up to 60 lines per page) that pdfplumber and PyPDF2 can extract"""
+    rng = random.Random(seed)
+    page_ids = [4 + 2 * index for index in range(pages)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id in page_ids:
+        lines = textwrap.wrap(_random_text(rng, chars_per_page), 95)[:60]
+        content = ("BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET").encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def synthetic_image(lines: int = 30, width: int = 1700, seed: int = 0, format: str = 'PNG') -> bytes:
+    """A scan-like page of black text on white, for the OCR path"""
+    from PIL import Image, ImageDraw, ImageFont
+    rng = random.Random(seed)
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        # Pillow < 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    line_height = 44
+    image = Image.new('L', (width, 100 + lines * line_height), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(textwrap.wrap(_random_text(rng, lines * 80), 80)[:lines]):
+        draw.text((60, 50 + index * line_height), line, fill=0, font=font)
+    out = io.BytesIO()
+    image.save(out, format=format)
+    return out.getvalue()
+
+
+def directory_size(path) -> int:
+    """Total bytes of the files under path"""
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file())
+
+
+def latency_summary(latencies: List[float], elapsed: float) -> dict:
+    """p50/p95/p99 of per-request latencies (seconds) and throughput over the wall-clock time"""
+    return {
+        'requests': len(latencies),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed(func, *args, **kwargs):
+    """Run func and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,513 @@
+"""
+Caches used by the ingestion and chat pipelines.
+"""
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .metrics import cache_lookup
+
+
+def hash_uploaded_file(uploaded_file) -> str:
+    """SHA-256 of an uploaded file, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def encode_vector(vector) -> str:
+    """Pack an embedding as base64 float32, a quarter of the size of JSON floats"""
+    return base64.b64encode(array('f', vector).tobytes()).decode('ascii')
+
+
+def decode_vector(encoded: str) -> List[float]:
+    values = array('f')
+    values.frombytes(base64.b64decode(encoded))
+    return values.tolist()
+
+
+class CachedContent:
+    """A cache entry: the chunks of a previously ingested file and their embeddings"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.preview = ""
+
+    def iter_chunks(self) -> Iterator[Tuple[str, List[float]]]:
+        """Yield (chunk, embedding) pairs; the preview is available once iteration finishes"""
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                if 'preview' in record:
+                    self.preview = record['preview']
+                else:
+                    yield record['text'], decode_vector(record['embedding'])
+
+
+class CachedContentWriter:
+    """Streams chunk batches into a temporary file that is published atomically on commit"""
+
+    def __init__(self, cache: 'ContentCache', key: str):
+        self.cache = cache
+        self.path = cache.path_for(key)
+        self.tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        self.file = None
+
+    def write_batch(self, chunks: List[str], embeddings: list):
+        if self.file is None:
+            self.cache.directory.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        for text, embedding in zip(chunks, embeddings):
+            self.file.write(json.dumps({'text': text, 'embedding': encode_vector(embedding)}) + "\n")
+
+    def commit(self, preview: str):
+        if self.file is None:
+            return
+        self.file.write(json.dumps({'preview': preview}) + "\n")
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        self.cache.evict()
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.tmp_path.unlink(missing_ok=True)
+
+
+class ContentCache:
+    """
+    Disk cache mapping a file's content hash to its extracted chunks and embeddings.
+
+    Entries are evicted least-recently-used first (by file modification time,
+    refreshed on every hit) once the directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.jsonl"
+
+    def get(self, key: str) -> Optional[CachedContent]:
+        path = self.path_for(key)
+        try:
+            # Touch the entry so it counts as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return CachedContent(path)
+
+    def writer(self, key: str) -> CachedContentWriter:
+        return CachedContentWriter(self, key)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for path in self.directory.glob('*.jsonl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed cache of embeddings keyed by model name plus text hash.
+
+    Shared by every process on the host. Entries beyond `max_entries` are
+    evicted least-recently-used first; lookups refresh an entry's recency.
+    """
+
+    EVICT_EVERY = 256
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._inserts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Cached vectors for the given texts, by position in `texts`"""
+        if not texts:
+            return {}
+        keys = [self.key(model, text) for text in texts]
+        connection = self._connection()
+        found = {}
+        unique_keys = list(set(keys))
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array('f')
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+            if rows:
+                connection.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                    [time.time(), *batch]
+                )
+
+        result = {index: found[key] for index, key in enumerate(keys) if key in found}
+        self.hits += len(result)
+        self.misses += len(texts) - len(result)
+        cache_lookup('embedding', True, len(result))
+        cache_lookup('embedding', False, len(texts) - len(result))
+        return result
+
+    def set_many(self, model: str, texts: List[str], vectors: list):
+        now = time.time()
+        rows = [
+            (self.key(model, text), array('f', vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        connection = self._connection()
+        # One transaction per batch rather than one per row
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._inserts_since_evict += len(rows)
+            should_evict = self._inserts_since_evict >= self.EVICT_EVERY
+            if should_evict:
+                self._inserts_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        connection = self._connection()
+        (count,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+
+class OCRCache:
+    """
+    SQLite-backed cache of recognised text keyed by image hash plus OCR settings.
+
+    Shared by every process on the host; least recently used entries beyond
+    `max_entries` are evicted.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._inserts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ocr ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[str]:
+        connection = self._connection()
+        row = connection.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+        cache_lookup('ocr', row is not None)
+        if row is None:
+            return None
+        connection.execute("UPDATE ocr SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def set(self, key: str, text: str):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO ocr (key, text, last_used) VALUES (?, ?, ?)", (key, text, time.time())
+        )
+        with self._lock:
+            self._inserts_since_evict += 1
+            should_evict = self._inserts_since_evict >= self.EVICT_EVERY
+            if should_evict:
+                self._inserts_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        connection = self._connection()
+        (count,) = connection.execute("SELECT COUNT(*) FROM ocr").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM ocr WHERE key IN (SELECT key FROM ocr ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what is being asked"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of LLM answers, shared by every process on the host.
+
+    An answer is stored under its normalized question and a scope: the hash of
+    the retrieved context plus the model settings, so a cached answer is only
+    reused when the documents behind it and the model producing it are the
+    same. Lookups try the exact question first and then, if a similarity
+    threshold is set, the most similar question asked in the same scope.
+    Entries expire after `ttl` seconds and are evicted least-recently-used
+    first beyond `max_entries`.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(self, path: Path, max_entries: int, ttl: float,
+                 similarity_threshold: Optional[float] = None, similarity_candidates: int = 200):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.similarity_candidates = similarity_candidates
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._inserts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, vector BLOB, response TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope, last_used)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def scope(context: str, model_settings: str, conversation: str = "") -> str:
+        """`conversation` is whatever of the chat so far reaches the prompt (history window and summary)"""
+        return hashlib.sha256(f"{model_settings}\0{context}\0{conversation}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key(scope: str, question: str) -> str:
+        return hashlib.sha256(f"{scope}\0{normalize_question(question)}".encode('utf-8')).hexdigest()
+
+    def _count(self, attribute: str):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def get(self, scope: str, question: str, embed_question=None) -> Optional[str]:
+        """
+        Cached answer to the question in this scope, or None.
+
+        `embed_question` is only called when the exact question is not cached
+        and the similarity tier is enabled.
+        """
+        connection = self._connection()
+        now = time.time()
+        oldest = now - self.ttl
+        key = self.key(scope, question)
+        row = connection.execute(
+            "SELECT response FROM responses WHERE key = ? AND created >= ?", (key, oldest)
+        ).fetchone()
+
+        if row is None and self.similarity_threshold is not None and embed_question:
+            candidates = connection.execute(
+                "SELECT key, vector, response FROM responses "
+                "WHERE scope = ? AND created >= ? AND vector IS NOT NULL "
+                "ORDER BY last_used DESC LIMIT ?",
+                (scope, oldest, self.similarity_candidates)
+            ).fetchall()
+            if candidates:
+                query = embed_question()
+                best_score = self.similarity_threshold
+                for candidate_key, blob, response in candidates:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    score = _cosine(query, vector)
+                    if score >= best_score:
+                        best_score = score
+                        key, row = candidate_key, (response,)
+                if row is not None:
+                    self._count('similar_hits')
+        elif row is not None:
+            self._count('exact_hits')
+
+        if row is None:
+            self._count('misses')
+            return None
+        connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, scope: str, question: str, response: str, question_vector: Optional[List[float]] = None):
+        now = time.time()
+        vector = array('f', question_vector).tobytes() if question_vector is not None else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO responses (key, scope, vector, response, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.key(scope, question), scope, vector, response, now, now)
+        )
+        with self._lock:
+            self._inserts_since_evict += 1
+            should_evict = self._inserts_since_evict >= self.EVICT_EVERY
+            if should_evict:
+                self._inserts_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used entries beyond max_entries"""
+        connection = self._connection()
+        connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                'exact_hits': self.exact_hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else None,
+            }
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+
+class RecentQueryCache:
+    """
+    In-process cache of recent retrieval results, per conversation.
+
+    Entries live `ttl` seconds and at most `max_entries` are kept (least
+    recently used go first). Writing to a conversation invalidates all of its
+    entries, including results computed concurrently with the write: a result
+    is only stored if no write happened since its lookup started.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._last_write = {}
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str, key) -> Tuple[object, float]:
+        """(cached value or None, stamp to pass to set() when storing a freshly computed value)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((conversation_id, key))
+            if entry is not None:
+                stamp, value = entry
+                if now - stamp < self.ttl and stamp > self._last_write.get(conversation_id, float('-inf')):
+                    self._entries.move_to_end((conversation_id, key))
+                    self.hits += 1
+                    return value, now
+                del self._entries[(conversation_id, key)]
+            self.misses += 1
+        return None, now
+
+    def set(self, conversation_id: str, key, value, stamp: float):
+        with self._lock:
+            if stamp <= self._last_write.get(conversation_id, float('-inf')):
+                # The conversation was written to while this result was being computed
+                return
+            self._entries[(conversation_id, key)] = (stamp, value)
+            self._entries.move_to_end((conversation_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, conversation_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[conversation_id] = now
+            # Writes older than the TTL can't affect any live entry
+            if len(self._last_write) > self.max_entries:
+                self._last_write = {
+                    conversation: written for conversation, written in self._last_write.items()
+                    if now - written < self.ttl
+                }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,176 @@
+"""
+Embedding providers handed to ChromaDB and used directly by the ingestion
+and retrieval paths.
+
+The backend is chosen with ``EMBEDDING_PROVIDER`` in settings:
+
+- ``gemini``: Google's remote embedding model (needs GEMINI_API_KEY)
+- ``local``: all-MiniLM-L6-v2 via ONNX Runtime on the CPU
+- ``hashing``: deterministic feature hashing, no model and no network (tests, benchmarks)
+"""
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import time
+from typing import List
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from django.conf import settings
+from .caches import EmbeddingCache
+
+
+class EmbeddingProvider(EmbeddingFunction[Documents], ABC):
+    """A named embedding backend that records how long its calls take"""
+
+    name = ''
+
+    def __init__(self, model: str):
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+        self.total_seconds = 0.0
+        self.warmup_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def MODEL_NAME(self) -> str:
+        return f"{self.name}/{self.model}"
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._timed(self.embed_documents, list(input))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._timed(self.embed_queries, [text])[0]
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Vectors of the texts, in order"""
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Providers with separate query and document modes override this"""
+        return self.embed_documents(texts)
+
+    def _timed(self, embed, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = embed(texts)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            self.total_seconds += elapsed
+        return vectors
+
+    def warmup(self) -> float:
+        """Load the model (and open any connection) ahead of the first real request"""
+        start = time.perf_counter()
+        self.embed_documents(["warmup"])
+        self.warmup_seconds = time.perf_counter() - start
+        return self.warmup_seconds
+
+    def latency_stats(self) -> dict:
+        with self._lock:
+            return {
+                'provider': self.name,
+                'model': self.model,
+                'warmup_ms': None if self.warmup_seconds is None else round(self.warmup_seconds * 1000, 1),
+                'calls': self.calls,
+                'texts': self.texts,
+                'avg_call_ms': round(self.total_seconds / self.calls * 1000, 2) if self.calls else None,
+            }
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    name = 'gemini'
+
+    def __init__(self, model: str = "models/embedding-001", api_key: str = ''):
+        super().__init__(model)
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        self.client = GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Gemini embeds retrieval queries with a different task type than documents
+        return [self.client.embed_query(text) for text in texts]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    name = 'local'
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2"):
+        super().__init__(model)
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        self.client = ONNXMiniLM_L6_V2(preferred_providers=['CPUExecutionProvider'])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(value) for value in vector] for vector in self.client(texts)]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic, network-free embeddings with an optional simulated per-call latency"""
+
+    name = 'hashing'
+
+    def __init__(self, dimensions: int = 384, latency: float = 0.0):
+        super().__init__(f"hashing-{dimensions}")
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode()).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+
+def get_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """Build the embedding provider selected in settings (or by name)"""
+    name = name or settings.EMBEDDING_PROVIDER
+    if name == 'gemini':
+        return GeminiEmbeddingProvider(settings.GEMINI_EMBEDDING_MODEL, settings.GEMINI_API_KEY)
+    if name == 'local':
+        return LocalEmbeddingProvider()
+    if name == 'hashing':
+        return HashingEmbeddingProvider(latency=settings.EMBEDDING_HASHING_LATENCY)
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Wraps a provider so texts already embedded with the same model are served from the cache"""
+
+    def __init__(self, provider: EmbeddingProvider, cache: EmbeddingCache):
+        self.provider = provider
+        self.MODEL_NAME = provider.MODEL_NAME
+        self.cache = cache
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._cached(self.MODEL_NAME, list(input), self.provider)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Query vectors may differ from document vectors for the same text, so they are keyed apart
+        def embed(texts):
+            return [self.provider.embed_query(query) for query in texts]
+        return self._cached(f"{self.MODEL_NAME}#query", [text], embed)[0]
+
+    def _cached(self, model_key: str, texts: List[str], embed) -> List[List[float]]:
+        cached = self.cache.get_many(model_key, texts)
+        missing = list(dict.fromkeys(text for index, text in enumerate(texts) if index not in cached))
+
+        if missing:
+            # One call to the underlying model for everything not cached yet
+            computed = [[float(value) for value in vector] for vector in embed(missing)]
+            self.cache.set_many(model_key, missing, computed)
+            by_text = dict(zip(missing, computed))
+            for index, text in enumerate(texts):
+                if index not in cached:
+                    cached[index] = by_text[text]
+
+        return [cached[index] for index in range(len(texts))]
@@ -0,0 +1,145 @@
+"""
+Page-level PDF text extraction.
+
+Functions here run inside a process pool, so they are kept at module level and
+free of Django imports. Each page is extracted with pdfplumber and falls back to
+PyPDF2 on its own when pdfplumber fails or finds no text on it. Pages with no
+text layer at all (scans) are rendered and OCR'd when ``ocr_dpi`` is set.
+"""
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+import PyPDF2
+from .ocr import ocr_prepared, prepare_image
+
+
+logger = logging.getLogger(__name__)
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def count_pages(file_path: str) -> int:
+    """Number of pages in the PDF, from pdfplumber when PyPDF2 can't parse it"""
+    try:
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception as e:
+        logger.warning("PyPDF2 failed to read %s, counting pages with pdfplumber: %s", file_path, e)
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+
+def _open_pdfplumber(file_path: str):
+    try:
+        import pdfplumber
+        return pdfplumber.open(file_path)
+    except ImportError:
+        return None
+    except Exception as e:
+        logger.warning("pdfplumber failed to open %s, using PyPDF2: %s", file_path, e)
+        return None
+
+
+def ocr_page(plumber_pdf, page_num: int, dpi: int, lang: str) -> str:
+    """Render a page without a text layer and OCR it"""
+    page = plumber_pdf.pages[page_num]
+    try:
+        return ocr_prepared(prepare_image(page.to_image(resolution=dpi).original, dpi), lang)
+    finally:
+        page.flush_cache()
+
+
+def _open_pypdf2(file) -> Optional[PyPDF2.PdfReader]:
+    try:
+        return PyPDF2.PdfReader(file)
+    except Exception as e:
+        logger.warning("PyPDF2 failed to open %s, using pdfplumber only: %s", file.name, e)
+        return None
+
+
+def iter_page_range(file_path: str, start: int, end: int, ocr_dpi: int = 0,
+                    ocr_lang: str = 'eng') -> Iterator[Tuple[int, str]]:
+    """Yield (page_num, text) for pages [start, end), falling back per page"""
+    plumber_pdf = _open_pdfplumber(file_path)
+    try:
+        with open(file_path, 'rb') as file:
+            reader = _open_pypdf2(file)
+            for page_num in range(start, end):
+                text = ""
+                if plumber_pdf is not None:
+                    try:
+                        page = plumber_pdf.pages[page_num]
+                        text = page.extract_text() or ""
+                        # Drop the parsed layout objects so long ranges don't accumulate them
+                        page.flush_cache()
+                    except Exception as page_error:
+                        logger.warning("pdfplumber error on page %d: %s", page_num + 1, page_error)
+
+                if not text.strip() and reader is not None:
+                    try:
+                        text = reader.pages[page_num].extract_text() or ""
+                    except Exception as page_error:
+                        logger.warning("Error extracting page %d: %s", page_num + 1, page_error)
+
+                if not text.strip() and ocr_dpi and plumber_pdf is not None:
+                    try:
+                        text = ocr_page(plumber_pdf, page_num, ocr_dpi, ocr_lang)
+                    except Exception as page_error:
+                        logger.warning("OCR error on page %d: %s", page_num + 1, page_error)
+
+                yield page_num, text
+    finally:
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+
+
+def extract_page_range(file_path: str, start: int, end: int, ocr_dpi: int = 0,
+                       ocr_lang: str = 'eng') -> List[Tuple[int, str]]:
+    """Extract pages [start, end) as (page_num, text) pairs; the unit of work sent to the pool"""
+    return list(iter_page_range(file_path, start, end, ocr_dpi, ocr_lang))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool, created on first use so worker start-up is paid once"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn rather than fork: callers may be multi-threaded web or ingestion processes
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def iter_pdf_pages(file_path: str, workers: int = 1, pages_per_task: int = 16, ocr_dpi: int = 0,
+                   ocr_lang: str = 'eng') -> Iterator[Tuple[int, str]]:
+    """Yield every page of the PDF in order, splitting page ranges across a process pool when it pays off"""
+    page_count = count_pages(file_path)
+    logger.debug("%s has %d pages", file_path, page_count)
+    pages_per_task = max(1, pages_per_task)
+
+    if workers <= 1 or page_count <= pages_per_task:
+        yield from iter_page_range(file_path, 0, page_count, ocr_dpi, ocr_lang)
+        return
+
+    ranges = iter([(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)])
+    pool = _get_pool(workers)
+
+    # Keep a bounded window of ranges in flight so extracted text never piles up ahead of the consumer
+    pending = deque(pool.submit(extract_page_range, file_path, start, end, ocr_dpi, ocr_lang)
+                    for start, end in islice(ranges, workers * 2))
+    while pending:
+        future = pending.popleft()
+        for start, end in islice(ranges, 1):
+            pending.append(pool.submit(extract_page_range, file_path, start, end, ocr_dpi, ocr_lang))
+        yield from future.result()
+
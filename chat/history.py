@@ -0,0 +1,156 @@
+"""
+Token-budgeted chat history.
+
+Turns that fall out of the newest ``HISTORY_MAX_TOKENS`` are folded, a batch
+at a time and in a background thread, into a rolling summary stored on the
+Conversation: ``summary`` covers every message up to ``summarized_through_id``
+and is sent in place of those turns. Every turn the summary doesn't cover yet
+is replayed to the LLM, up to the window plus ``HISTORY_SUMMARY_MIN_TOKENS``,
+which is all of them while folding keeps up. Turns are read newest first from
+the database, at most ``HISTORY_MAX_MESSAGES`` of them, so long conversations
+are never loaded in full; turns past that row cap are folded whatever their
+size, so many short turns are summarized rather than dropped.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections
+from .models import Conversation
+
+
+logger = logging.getLogger(__name__)
+
+
+# Role markers and separators the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_executor = None
+_executor_lock = threading.Lock()
+_folding = set()
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text, estimated from its length if tiktoken's encoding can't be loaded"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(settings.HISTORY_TOKEN_ENCODING)
+        except Exception as e:
+            logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def take_window(messages: Iterable[dict], max_tokens: int) -> List[dict]:
+    """Take messages newest first until the token budget is spent, returning them oldest first"""
+    window = []
+    used = 0
+    for message in messages:
+        used += message_tokens(message)
+        if used > max_tokens:
+            break
+        window.append(message)
+    window.reverse()
+    return window
+
+
+def _unsummarized(conversation, before_id: Optional[int] = None):
+    """Messages not yet covered by the conversation's summary"""
+    messages = conversation.messages.filter(id__gt=conversation.summarized_through_id)
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+    return messages
+
+
+def _tail(conversation, before_id: Optional[int] = None):
+    """Newest unsummarized messages, newest first, capped at HISTORY_MAX_MESSAGES"""
+    return _unsummarized(conversation, before_id).order_by('-id').values(
+        'id', 'message_type', 'content'
+    )[:settings.HISTORY_MAX_MESSAGES]
+
+
+def prompt_budget() -> int:
+    """Tokens of unsummarized turns sent with a question: the window plus what may wait to be folded"""
+    return settings.HISTORY_MAX_TOKENS + settings.HISTORY_SUMMARY_MIN_TOKENS
+
+
+async def aget_history(conversation, before_id: Optional[int] = None) -> Tuple[str, List[dict]]:
+    """
+    (summary, newest messages the summary doesn't cover yet within the prompt budget)
+    to send with a question, excluding messages from before_id on
+    """
+    messages = [message async for message in _tail(conversation, before_id)]
+    return conversation.summary, take_window(messages, prompt_budget())
+
+
+def fold_history(conversation_id: int, summarize: Callable[[str, List[dict]], str]) -> bool:
+    """Fold the oldest turns that dropped out of the window into the summary, returning True if it changed"""
+    conversation = Conversation.objects.get(pk=conversation_id)
+    tail = list(_tail(conversation))
+    window = take_window(tail, settings.HISTORY_MAX_TOKENS)
+    # A newest message larger than the whole budget leaves the window empty
+    boundary = window[0]['id'] if window else None
+    # Turns older than the rows read for the prompt are never sent, so they are folded however small
+    past_cap = len(tail) == settings.HISTORY_MAX_MESSAGES and _unsummarized(
+        conversation, before_id=tail[-1]['id']
+    ).exists()
+
+    # Oldest first, so the summary always covers a contiguous prefix of the conversation
+    dropped = _unsummarized(conversation, before_id=boundary).order_by('id').values(
+        'id', 'message_type', 'content'
+    )[:settings.HISTORY_MAX_MESSAGES]
+    batch = []
+    tokens = 0
+    for message in dropped:
+        tokens += message_tokens(message)
+        if batch and tokens > settings.HISTORY_SUMMARY_BATCH_TOKENS:
+            break
+        batch.append(message)
+    if not batch or (tokens < settings.HISTORY_SUMMARY_MIN_TOKENS and not past_cap):
+        # Wait until enough has dropped out to be worth an LLM call
+        return False
+
+    summary = summarize(conversation.summary, batch)
+    # Only the first of two concurrent folds of the same turns is kept
+    return Conversation.objects.filter(
+        pk=conversation.pk, summarized_through_id=conversation.summarized_through_id
+    ).update(summary=summary, summarized_through_id=batch[-1]['id']) == 1
+
+
+def _fold_in_thread(conversation_id: int, service) -> None:
+    """Thread pool entry point, owning its own database connection"""
+    close_old_connections()
+    try:
+        if fold_history(conversation_id, service.summarize_history):
+            logger.info("Updated history summary of conversation %s", conversation_id)
+    except Exception as e:
+        logger.error("Error summarizing history of conversation %s: %s", conversation_id, e)
+    finally:
+        with _executor_lock:
+            _folding.discard(conversation_id)
+        close_old_connections()
+
+
+def schedule_fold(conversation_id: int, service) -> None:
+    """Fold older turns into the summary in the background, at most once at a time per conversation"""
+    global _executor
+    with _executor_lock:
+        if conversation_id in _folding:
+            return
+        _folding.add(conversation_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.HISTORY_SUMMARY_THREADS,
+                thread_name_prefix='history'
+            )
+    _executor.submit(_fold_in_thread, conversation_id, service)
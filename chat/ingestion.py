@@ -0,0 +1,300 @@
+"""
+Background ingestion of uploaded documents.
+
+Uploads are saved as ``pending`` Document rows and processed outside the
+request: either by a small thread pool inside the web process
+(``INGESTION_MODE = 'thread'``) or by ``python manage.py ingest_worker``
+processes polling the database (``INGESTION_MODE = 'worker'``). Each document
+moves through pending -> extracting -> embedding -> ready, or ends up failed
+with the error recorded. A claimed document whose worker has not reported
+progress for INGESTION_CLAIM_TIMEOUT seconds (it crashed or was stopped) goes
+back to pending; in thread mode the web process picks up pending documents
+left over from before it started. PDFs are streamed page by page into the chunker and
+the vector store, so memory use does not grow with document size.
+
+Files uploaded together are ingested together: up to INGESTION_BATCH_WORKERS
+of them are extracted at once and their chunks share embedding calls and
+vector store writes.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Iterable, Iterator, List, Optional
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from .metrics import ERRORS, cache_lookup, stage
+from .models import Document
+
+
+logger = logging.getLogger(__name__)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+RESUME_DISPATCH_UID = 'chat.ingestion.resume_pending_documents'
+
+def claim_document(document_id: int) -> bool:
+    """Atomically move a pending document to extracting, returning False if someone else got it"""
+    return Document.objects.filter(
+        pk=document_id, status=Document.STATUS_PENDING
+    ).update(status=Document.STATUS_EXTRACTING, claimed_at=timezone.now()) == 1
+
+
+def release_stale_claims() -> int:
+    """Put documents whose worker stopped reporting progress back in the queue"""
+    cutoff = timezone.now() - timedelta(seconds=settings.INGESTION_CLAIM_TIMEOUT)
+    released = Document.objects.filter(
+        status__in=[Document.STATUS_EXTRACTING, Document.STATUS_EMBEDDING]
+    ).filter(
+        Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True)
+    ).update(status=Document.STATUS_PENDING, claimed_at=None)
+    if released:
+        logger.warning("Re-queued %d documents abandoned during ingestion", released)
+    return released
+
+
+class _Heartbeat:
+    """Refreshes a claimed document's claimed_at, at most a few times per claim timeout"""
+
+    def __init__(self, document_id: int):
+        self.document_id = document_id
+        self.interval = settings.INGESTION_CLAIM_TIMEOUT / 4
+        self.last = time.monotonic()
+
+    def __call__(self, *args):
+        if time.monotonic() - self.last >= self.interval:
+            self.last = time.monotonic()
+            Document.objects.filter(pk=self.document_id).update(claimed_at=timezone.now())
+
+
+def claim_next_document() -> Optional[int]:
+    """Claim the oldest pending document, if any"""
+    pending = Document.objects.filter(status=Document.STATUS_PENDING).order_by('uploaded_at', 'id')
+    for document_id in pending.values_list('id', flat=True)[:10]:
+        if claim_document(document_id):
+            return document_id
+    return None
+
+
+class _TextPreview:
+    """Pass a text stream through, keeping only its first `limit` characters"""
+
+    def __init__(self, texts: Iterable[str], limit: int, on_first: Callable[[], None] = None,
+                 on_text: Callable[[], None] = None):
+        self.texts = texts
+        self.limit = limit
+        self.on_first = on_first
+        self.on_text = on_text
+        self.parts = []
+        self.length = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for index, text in enumerate(self.texts):
+            if index == 0 and self.on_first:
+                self.on_first()
+            if self.on_text:
+                self.on_text()
+            if self.length < self.limit:
+                self.parts.append(text[:self.limit - self.length])
+                self.length += len(self.parts[-1])
+            yield text
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+@stage('ingestion')
+def ingest_document(document_id: int, service, combined=None) -> None:
+    """
+    Stream a claimed document through extraction, chunking and embedding, recording its progress.
+    Chunks go through the `combined` writer when the document is ingested as part of a batch.
+    """
+    heartbeat = _Heartbeat(document_id)
+    writer = None
+
+    try:
+        document = Document.objects.select_related('conversation').get(pk=document_id)
+
+        def mark_embedding():
+            # Extraction and embedding overlap: the first page is out, chunks are being written
+            document.status = Document.STATUS_EMBEDDING
+            document.save(update_fields=['status'])
+
+        # Image descriptions embed the upload's filename, so only PDFs are shared across uploads
+        cache_key = None
+        if document.content_hash and document.file_type == 'pdf':
+            cache_key = f"{document.content_hash}-{service.ingestion_fingerprint}"
+        cached = service.content_cache.get(cache_key) if cache_key else None
+        if cache_key:
+            cache_lookup('content', cached is not None)
+
+        if cached:
+            # Same bytes were ingested before: reuse the chunks and embeddings
+            mark_embedding()
+            added = service.add_embedded_chunks_to_vectordb(
+                cached.iter_chunks(), str(document.id), document.conversation.session_id
+            )
+            preview_text = cached.preview
+            logger.info("Reused cached content for document %s", document.id)
+        else:
+            file_path = document.file.path
+            if document.file_type == 'pdf':
+                texts = service.iter_pdf_text(file_path)
+            else:
+                texts = [service.process_image(file_path)]
+
+            # Only a bounded preview is kept in the database, never the whole document
+            preview = _TextPreview(texts, settings.DOCUMENT_PREVIEW_CHARS, on_first=mark_embedding,
+                                   on_text=heartbeat)
+            writer = service.content_cache.writer(cache_key) if cache_key else None
+            added = service.add_texts_to_vectordb(
+                preview, str(document.id), document.conversation.session_id,
+                on_batch=writer.write_batch if writer else None,
+                combined=combined
+            )
+            preview_text = preview.text
+        if not added:
+            raise ValueError("No text could be extracted from the file")
+
+        if writer:
+            writer.commit(preview_text)
+        document.processed_content = preview_text
+        document.status = Document.STATUS_READY
+        document.claimed_at = None
+        document.save(update_fields=['processed_content', 'status', 'claimed_at'])
+        logger.info("Document %s is ready (%d chunks)", document.id, added)
+
+    except Exception as e:
+        logger.error("Error ingesting document %s: %s", document_id, e)
+        ERRORS.inc(stage='ingestion')
+        if writer:
+            writer.discard()
+        # Update by id: the failure may have come from loading the row itself
+        Document.objects.filter(pk=document_id).update(
+            status=Document.STATUS_FAILED, error=str(e), claimed_at=None
+        )
+
+
+def _ingest_in_thread(document_id: int, service) -> None:
+    """Thread pool entry point, owning its own database connection"""
+    close_old_connections()
+    try:
+        if claim_document(document_id):
+            ingest_document(document_id, service)
+    finally:
+        close_old_connections()
+
+
+def _ingest_batch_member(document_id: int, service, combined) -> bool:
+    close_old_connections()
+    try:
+        # Claimed only when a batch worker gets to it, so waiting members can't time out
+        if not claim_document(document_id):
+            return False
+        ingest_document(document_id, service, combined)
+        return True
+    finally:
+        close_old_connections()
+
+
+def ingest_documents(document_ids: List[int], service) -> None:
+    """
+    Ingest documents uploaded together to one conversation: extract them
+    concurrently and write their chunks in combined batches.
+    """
+    pending = list(Document.objects.filter(
+        pk__in=document_ids, status=Document.STATUS_PENDING
+    ).values_list('id', flat=True))
+    if not pending:
+        return
+    conversation_id = Document.objects.select_related('conversation').get(pk=pending[0]).conversation.session_id
+    try:
+        combined = service.combined_writer(conversation_id)
+    except Exception as e:
+        logger.error("Could not open the vector store for batch ingestion: %s", e)
+        combined = None
+
+    workers = max(1, min(settings.INGESTION_BATCH_WORKERS, len(pending)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingestion-batch') as executor:
+        ingested = sum(executor.map(lambda document_id: _ingest_batch_member(document_id, service, combined), pending))
+    if combined is not None:
+        logger.info("Ingested %d documents in %d combined vector store writes", ingested, combined.writes)
+
+
+def _ingest_batch_in_thread(document_ids: List[int], service) -> None:
+    close_old_connections()
+    try:
+        ingest_documents(document_ids, service)
+    finally:
+        close_old_connections()
+
+
+def _submit(fn: Callable, *args) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGESTION_THREADS,
+                thread_name_prefix='ingestion'
+            )
+    _executor.submit(fn, *args)
+
+
+def enqueue_documents(document_ids: List[int], service) -> None:
+    """Schedule ingestion of files uploaded together, processed as one batch in thread mode"""
+    if settings.INGESTION_MODE != 'thread':
+        # Worker mode: each pending row is picked up by the workers on its own
+        return
+    _submit(_ingest_batch_in_thread, document_ids, service)
+
+
+def enqueue_document(document_id: int, service) -> None:
+    """Schedule ingestion of a freshly uploaded document according to INGESTION_MODE"""
+    if settings.INGESTION_MODE != 'thread':
+        # Worker mode: the pending row itself is the queue entry
+        return
+    _submit(_ingest_in_thread, document_id, service)
+
+
+def _resume_in_thread(service) -> None:
+    close_old_connections()
+    try:
+        release_stale_claims()
+        pending = Document.objects.filter(status=Document.STATUS_PENDING).order_by('uploaded_at', 'id')
+        for document_id in pending.values_list('id', flat=True):
+            enqueue_document(document_id, service)
+    finally:
+        close_old_connections()
+
+
+def resume_pending_documents(sender=None, **kwargs) -> None:
+    """
+    request_started receiver for thread mode: on the first request, queue the
+    documents left pending (or abandoned mid-ingestion) by an earlier process
+    """
+    from django.core.signals import request_started
+    from .ai_service import get_ai_service
+    if not request_started.disconnect(dispatch_uid=RESUME_DISPATCH_UID):
+        # Another request got here first
+        return
+    _submit(_resume_in_thread, get_ai_service())
+
+
+def run_worker(service, poll_interval: float = None) -> None:
+    """Poll the database for pending documents and ingest them until interrupted"""
+    poll_interval = poll_interval or settings.INGESTION_POLL_INTERVAL
+    while True:
+        close_old_connections()
+        document_id = claim_next_document()
+        if document_id is None:
+            # Documents of a crashed worker rejoin the queue once their claim times out
+            release_stale_claims()
+            time.sleep(poll_interval)
+            continue
+        ingest_document(document_id, service)
@@ -0,0 +1,87 @@
+"""
+Chat models behind the LLM gateway.
+
+The backend is chosen with ``LLM_PROVIDER`` in settings:
+
+- ``gemini``: Google's Gemini through langchain-google-genai (needs GEMINI_API_KEY)
+- ``fake``: deterministic replies after a simulated latency, no network (benchmarks)
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import AsyncIterator, List
+from django.conf import settings
+from .benchmarking import WORDS
+
+
+class FakeChatModel:
+    """
+    Stand-in for ChatGoogleGenerativeAI with the methods the gateway calls.
+
+    The reply depends only on the prompt, so identical prompts get identical
+    answers. It arrives after `latency` seconds (time to first token) plus
+    `token_latency` seconds per token, streamed or not.
+    """
+
+    def __init__(self, model: str = "fake-chat", latency: float = 0.0, token_latency: float = 0.0,
+                 completion_tokens: int = 60, temperature: float = 0.7):
+        self.model = model
+        self.temperature = temperature
+        self.latency = latency
+        self.token_latency = token_latency
+        self.completion_tokens = completion_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _tokens(self, messages: list) -> List[str]:
+        with self._lock:
+            self.calls += 1
+        prompt = "\n".join(f"{message.type}:{message.content}" for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+        return [("" if index == 0 else " ") + rng.choice(WORDS) for index in range(self.completion_tokens)]
+
+    def _duration(self, tokens: List[str]) -> float:
+        return self.latency + self.token_latency * len(tokens)
+
+    def invoke(self, messages: list, **kwargs):
+        from langchain_core.messages import AIMessage
+        tokens = self._tokens(messages)
+        time.sleep(self._duration(tokens))
+        return AIMessage(content="".join(tokens))
+
+    async def ainvoke(self, messages: list, **kwargs):
+        from langchain_core.messages import AIMessage
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self._duration(tokens))
+        return AIMessage(content="".join(tokens))
+
+    async def astream(self, messages: list, **kwargs) -> AsyncIterator:
+        from langchain_core.messages import AIMessageChunk
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
+
+
+def get_chat_model(name: str = None):
+    """Build the chat model selected in settings (or by name)"""
+    name = name or settings.LLM_PROVIDER
+    if name == 'gemini':
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model="gemini-1.5-flash",
+            google_api_key=settings.GEMINI_API_KEY,
+            temperature=0.7,
+            # Retries are handled by the gateway, which also backs off between them
+            max_retries=1
+        )
+    if name == 'fake':
+        return FakeChatModel(
+            latency=settings.LLM_FAKE_LATENCY,
+            token_latency=settings.LLM_FAKE_TOKEN_LATENCY,
+            completion_tokens=settings.LLM_FAKE_COMPLETION_TOKENS
+        )
+    raise ValueError(f"Unknown LLM provider: {name}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chat.benchmarking import synthetic_document, timed
+from chat.embeddings import get_embedding_provider
+
+
+class Command(BaseCommand):
+    help = "Report warm-up time and per-call latency for each embedding provider"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', nargs='+', default=['hashing', 'local', 'gemini'])
+        parser.add_argument('--pages', type=int, default=20, help="Pages in the synthetic document")
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--queries', type=int, default=20)
+
+    def handle(self, *args, **options):
+        content = synthetic_document(pages=options['pages'])
+        chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(content)
+        batch_size = options['batch_size']
+        self.stdout.write(f"{len(chunks)} chunks, batch size {batch_size}, {options['queries']} queries")
+
+        for name in options['providers']:
+            try:
+                provider = get_embedding_provider(name)
+                provider.warmup()
+                for start in range(0, len(chunks), batch_size):
+                    provider(chunks[start:start + batch_size])
+                _, query_seconds = timed(
+                    lambda: [provider.embed_query(f"question {i}") for i in range(options['queries'])]
+                )
+            except Exception as e:
+                self.stdout.write(f"{name:<8} unavailable: {e}")
+                continue
+
+            stats = provider.latency_stats()
+            self.stdout.write(
+                f"{name:<8} warmup {stats['warmup_ms']:8.1f} ms  "
+                f"avg call {stats['avg_call_ms']:8.2f} ms  "
+                f"query {query_seconds / options['queries'] * 1000:8.2f} ms  "
+                f"{stats['texts'] / (provider.total_seconds or 1e-9):10.1f} texts/sec"
+            )
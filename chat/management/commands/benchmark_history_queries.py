@@ -0,0 +1,80 @@
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from chat.benchmarking import synthetic_chunks, timed
+from chat.models import Conversation, Document, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the queries and time the conversation detail, message and listing endpoints as "
+        "history grows; fails if the query count of any endpoint depends on the history length"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, nargs='+', default=[10, 100, 1000, 5000])
+        parser.add_argument('--documents', type=int, default=3)
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        counts = {}
+        for size in options['messages']:
+            conversation = self._conversation(size, options['documents'])
+            try:
+                base = f"/api/conversations/{conversation.session_id}"
+                detail = self._measure(client, f"{base}/")
+                older = detail['data']['older_cursor']
+                requests = {
+                    'detail': detail,
+                    'older page': self._measure(client, f"{base}/messages/?before={older}") if older else None,
+                    'first page': self._measure(client, f"{base}/messages/"),
+                    'listing': self._measure(client, "/api/conversations/"),
+                }
+            finally:
+                conversation.delete()
+
+            for name, result in requests.items():
+                if result is None:
+                    continue
+                counts.setdefault(name, set()).add(result['queries'])
+                self.stdout.write(
+                    f"{size:>6} messages  {name:<11} {result['queries']:>2} queries  "
+                    f"{result['elapsed'] * 1000:8.2f} ms"
+                )
+
+        growing = [name for name, seen in counts.items() if len(seen) > 1]
+        if growing:
+            raise CommandError(f"Query count depends on history length: {', '.join(growing)}")
+        self.stdout.write("Query counts are constant")
+
+    def _conversation(self, size: int, documents: int) -> Conversation:
+        conversation = Conversation.objects.create(session_id=f"bench-{uuid.uuid4()}")
+        start = timezone.now() - timedelta(seconds=size)
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                message_type='user' if index % 2 == 0 else 'assistant',
+                content=text,
+                timestamp=start + timedelta(seconds=index)
+            )
+            for index, text in enumerate(synthetic_chunks(size, chars=200))
+        ], batch_size=500)
+        Document.objects.bulk_create([
+            Document(
+                conversation=conversation, file=f'documents/bench-{index}.pdf', file_type='pdf',
+                original_filename=f'bench-{index}.pdf', status=Document.STATUS_READY
+            )
+            for index in range(documents)
+        ])
+        return conversation
+
+    def _measure(self, client: Client, url: str) -> dict:
+        with CaptureQueriesContext(connection) as queries:
+            response, elapsed = timed(client.get, url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}")
+        return {'queries': len(queries), 'elapsed': elapsed, 'data': response.json()}
@@ -0,0 +1,48 @@
+import tempfile
+import chromadb
+from chromadb.config import Settings
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chat.ai_service import add_chunks_in_batches
+from chat.benchmarking import synthetic_document, timed
+from chat.embeddings import HashingEmbeddingProvider
+
+
+class Command(BaseCommand):
+    help = "Measure vector insertion throughput (chunks/sec) per chunk versus in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=300, help="Pages in the synthetic document")
+        parser.add_argument('--batch-size', type=int, default=settings.VECTORDB_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.VECTORDB_EMBEDDING_WORKERS,
+                            help="Batches embedded concurrently")
+        parser.add_argument('--embedding-latency', type=float, default=0.005,
+                            help="Simulated seconds per embedding call, standing in for a remote model")
+
+    def handle(self, *args, **options):
+        content = synthetic_document(pages=options['pages'])
+        chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(content)
+        embedding_function = HashingEmbeddingProvider(latency=options['embedding_latency'])
+        self.stdout.write(f"Synthetic document: {options['pages']} pages, {len(chunks)} chunks")
+
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+            batch_size = max(1, min(options['batch_size'], client.get_max_batch_size()))
+
+            # Previous behaviour: one embedding call and one write per chunk
+            collection = client.create_collection('per_chunk', embedding_function=embedding_function)
+            _, per_chunk = timed(add_chunks_in_batches, collection, chunks, 'bench', embedding_function, 1)
+            self._report("per-chunk", len(chunks), per_chunk)
+
+            collection = client.create_collection('batched', embedding_function=embedding_function)
+            _, batched = timed(
+                add_chunks_in_batches, collection, chunks, 'bench', embedding_function,
+                batch_size, options['workers']
+            )
+            self._report(f"batched (size={batch_size}, workers={options['workers']})", len(chunks), batched)
+
+        self.stdout.write(f"Speedup: {per_chunk / batched:.1f}x")
+
+    def _report(self, label: str, chunks: int, elapsed: float):
+        self.stdout.write(f"{label:<40} {elapsed:8.2f}s {chunks / elapsed:10.1f} chunks/sec")
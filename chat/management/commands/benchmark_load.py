@@ -0,0 +1,218 @@
+import asyncio
+import tempfile
+import time
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_started
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.utils import timezone
+from chat.ai_service import ERROR_RESPONSE, get_ai_service
+from chat.benchmarking import latency_summary, synthetic_chunks, synthetic_image, synthetic_pdf
+from chat.ingestion import RESUME_DISPATCH_UID
+from chat.models import Conversation, Document, Message
+
+
+SCENARIOS = ('chat', 'history', 'upload')
+IN_PROGRESS = (Document.STATUS_PENDING, Document.STATUS_EXTRACTING, Document.STATUS_EMBEDDING)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test /api/chat/ and /api/upload/ in-process against a fake LLM and hashing embeddings "
+        "with simulated latency: concurrent chat, chat over a long history and a bulk upload, "
+        "reporting p50/p95/p99 latency and requests/sec"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument('--requests', type=int, default=100, help="Chat requests per chat scenario")
+        parser.add_argument('--concurrency', type=int, default=10, help="Requests in flight at once")
+        parser.add_argument('--conversations', type=int, default=5,
+                            help="Conversations the concurrent chat requests are spread over")
+        parser.add_argument('--history-messages', type=int, default=2000,
+                            help="Messages already in the conversation of the long-history scenario")
+        parser.add_argument('--pdfs', type=int, default=20, help="PDFs in the bulk upload")
+        parser.add_argument('--images', type=int, default=0,
+                            help="Scanned pages in the bulk upload (OCR'd, so tesseract must be installed)")
+        parser.add_argument('--pages', type=int, default=10, help="Pages per synthetic PDF")
+        parser.add_argument('--llm-latency', type=float, default=settings.LLM_FAKE_LATENCY,
+                            help="Simulated seconds to the first token")
+        parser.add_argument('--token-latency', type=float, default=settings.LLM_FAKE_TOKEN_LATENCY,
+                            help="Simulated seconds per generated token")
+        parser.add_argument('--embedding-latency', type=float, default=0.005,
+                            help="Simulated seconds per embedding call")
+        parser.add_argument('--ingestion-timeout', type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        if settings.AI_SERVICE_PREWARM:
+            raise CommandError("Unset AI_SERVICE_PREWARM: the benchmark builds the AI service with its own backends")
+
+        # Documents left pending in the database belong to the real media directory,
+        # not the scratch one; they must not be picked up by this run
+        request_started.disconnect(dispatch_uid=RESUME_DISPATCH_UID)
+
+        # Vector store, caches and uploads live in a scratch directory; conversations
+        # go to the configured database and are deleted afterwards
+        with tempfile.TemporaryDirectory() as path, override_settings(**self._settings(Path(path), options)):
+            asyncio.run(self._run(options))
+
+    def _settings(self, path: Path, options: dict) -> dict:
+        return {
+            'LLM_PROVIDER': 'fake',
+            'LLM_FAKE_LATENCY': options['llm_latency'],
+            'LLM_FAKE_TOKEN_LATENCY': options['token_latency'],
+            'EMBEDDING_PROVIDER': 'hashing',
+            'EMBEDDING_HASHING_LATENCY': options['embedding_latency'],
+            'PROMPT_CONTEXT_CACHE': 'none',
+            # Every question is new anyway; a cached answer would hide the LLM latency
+            'RESPONSE_CACHE_ENABLED': False,
+            'INGESTION_MODE': 'thread',
+            'VECTORDB_MODE': 'embedded',
+            'VECTORDB_PATH': path / 'vectordb',
+            'KEYWORD_INDEX_PATH': path / 'cache' / 'keyword_index.sqlite3',
+            'EMBEDDING_CACHE_PATH': path / 'cache' / 'embeddings.sqlite3',
+            'RESPONSE_CACHE_PATH': path / 'cache' / 'responses.sqlite3',
+            'OCR_CACHE_PATH': path / 'cache' / 'ocr.sqlite3',
+            'CONTENT_CACHE_PATH': path / 'cache' / 'content',
+            'MEDIA_ROOT': path / 'media',
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+
+    async def _run(self, options: dict):
+        client = AsyncClient()
+        sessions = []
+        try:
+            for scenario in options['scenarios']:
+                await getattr(self, f'_{scenario}')(client, options, sessions)
+        finally:
+            await Conversation.objects.filter(session_id__in=sessions).adelete()
+
+        stats = get_ai_service().llm_gateway.stats()
+        self.stdout.write(
+            f"LLM gateway: {stats['calls']} calls, {stats['retries']} retries, "
+            f"avg wait {stats['avg_wait_ms']} ms, max wait {stats['max_wait_ms']} ms"
+        )
+
+    async def _chat(self, client: AsyncClient, options: dict, sessions: list):
+        session_ids = await self._conversations_with_documents(client, options, options['conversations'], sessions)
+        await self._chat_load('chat', client, options, session_ids, seed=1)
+
+    async def _history(self, client: AsyncClient, options: dict, sessions: list):
+        session_ids = await self._conversations_with_documents(client, options, 1, sessions)
+        await sync_to_async(self._fill_history)(session_ids[0], options['history_messages'])
+        label = f"history ({options['history_messages']} messages)"
+        await self._chat_load(label, client, options, session_ids, seed=2)
+
+    async def _upload(self, client: AsyncClient, options: dict, sessions: list):
+        session_id = await self._start_conversation(client, sessions)
+        files = [(f'report-{index}.pdf', synthetic_pdf(options['pages'], seed=1000 + index))
+                 for index in range(options['pdfs'])]
+        files += [(f'scan-{index}.png', synthetic_image(seed=index)) for index in range(options['images'])]
+
+        start = time.perf_counter()
+        responses = await self._load(
+            'upload', options['concurrency'],
+            [partial(self._post_file, client, session_id, name, data) for name, data in files],
+            lambda response: response.status_code == 202
+        )
+        document_ids = [response.json()['document']['id'] for response in responses if response.status_code == 202]
+        failed = await self._wait_ready(document_ids, options['ingestion_timeout'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{'ingestion':<28} {len(document_ids):>5} files  {failed:>3} failed  "
+            f"{elapsed:8.2f}s until ready  {len(document_ids) / elapsed:8.2f} files/sec"
+        )
+
+    async def _chat_load(self, label: str, client: AsyncClient, options: dict, session_ids: list, seed: int):
+        questions = synthetic_chunks(options['requests'], chars=80, seed=seed)
+        requests = [
+            partial(
+                client.post, '/api/chat/',
+                {'message': question, 'session_id': session_ids[index % len(session_ids)]},
+                content_type='application/json'
+            )
+            for index, question in enumerate(questions)
+        ]
+        await self._load(label, options['concurrency'], requests, self._answered)
+
+    async def _load(self, label: str, concurrency: int, requests: list, ok) -> list:
+        """Send the requests `concurrency` at a time and report their latencies"""
+        pending = iter(requests)
+        latencies, responses = [], []
+
+        async def worker():
+            for send in pending:
+                sent = time.perf_counter()
+                response = await send()
+                latencies.append(time.perf_counter() - sent)
+                responses.append(response)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        summary = latency_summary(latencies, time.perf_counter() - start)
+        errors = sum(1 for response in responses if not ok(response))
+        self.stdout.write(
+            f"{label:<28} {summary['requests']:>5} requests  {errors:>3} errors  "
+            f"p50 {summary['p50'] * 1000:8.1f} ms  p95 {summary['p95'] * 1000:8.1f} ms  "
+            f"p99 {summary['p99'] * 1000:8.1f} ms  {summary['rps']:8.1f} req/s"
+        )
+        return responses
+
+    @staticmethod
+    def _answered(response) -> bool:
+        return response.status_code == 200 and response.json()['ai_message']['content'] != ERROR_RESPONSE
+
+    async def _start_conversation(self, client: AsyncClient, sessions: list) -> str:
+        response = await client.post('/api/conversations/start/')
+        if response.status_code != 201:
+            raise CommandError(f"Starting a conversation returned {response.status_code}")
+        sessions.append(response.json()['session_id'])
+        return sessions[-1]
+
+    async def _post_file(self, client: AsyncClient, session_id: str, name: str, data: bytes):
+        return await client.post('/api/upload/', {'file': SimpleUploadedFile(name, data), 'session_id': session_id})
+
+    async def _conversations_with_documents(self, client: AsyncClient, options: dict, count: int,
+                                            sessions: list) -> list:
+        """Conversations with one ingested PDF each, so every question goes through retrieval"""
+        session_ids, document_ids = [], []
+        for index in range(count):
+            session_id = await self._start_conversation(client, sessions)
+            response = await self._post_file(client, session_id, f'context-{index}.pdf',
+                                             synthetic_pdf(options['pages'], seed=index))
+            if response.status_code != 202:
+                raise CommandError(f"Uploading a context document returned {response.status_code}")
+            session_ids.append(session_id)
+            document_ids.append(response.json()['document']['id'])
+        if await self._wait_ready(document_ids, options['ingestion_timeout']):
+            raise CommandError("A context document failed to ingest")
+        return session_ids
+
+    async def _wait_ready(self, document_ids: list, timeout: float) -> int:
+        """Wait for the documents to finish ingesting and return how many failed"""
+        deadline = time.monotonic() + timeout
+        documents = Document.objects.filter(id__in=document_ids)
+        while await documents.filter(status__in=IN_PROGRESS).aexists():
+            if time.monotonic() > deadline:
+                raise CommandError(f"Documents still ingesting after {timeout:.0f}s")
+            await asyncio.sleep(0.1)
+        return await documents.filter(status=Document.STATUS_FAILED).acount()
+
+    def _fill_history(self, session_id: str, size: int):
+        conversation = Conversation.objects.get(session_id=session_id)
+        start = timezone.now() - timedelta(seconds=size)
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                message_type='user' if index % 2 == 0 else 'assistant',
+                content=text,
+                timestamp=start + timedelta(seconds=index)
+            )
+            for index, text in enumerate(synthetic_chunks(size, chars=200, seed=size))
+        ], batch_size=500)
@@ -0,0 +1,94 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+import chromadb
+from chromadb.config import Settings
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.ai_service import embed_in_batches, write_batches
+from chat.benchmarking import percentile, synthetic_chunks
+from chat.embeddings import get_embedding_provider
+from chat.retrieval import KeywordIndex, hybrid_search
+
+
+CONVERSATION_ID = "bench"
+
+
+class Command(BaseCommand):
+    help = "Measure recall and latency of vector, keyword and hybrid retrieval on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=20)
+        parser.add_argument('--chunks-per-document', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=5, help="Recall is measured in the top k chunks")
+        parser.add_argument('--provider', default='hashing', choices=['hashing', 'local', 'gemini'])
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        provider = get_embedding_provider(options['provider'])
+        documents = self._corpus(rng, options['documents'], options['chunks_per_document'])
+        # Each query asks about an identifier that appears in exactly one chunk
+        planted = list(self._codes(documents).items())
+        queries = rng.sample(planted, min(options['queries'], len(planted)))
+        self.stdout.write(
+            f"{options['documents']} documents x {options['chunks_per_document']} chunks, "
+            f"{len(queries)} queries, recall@{options['k']}, {provider.MODEL_NAME}"
+        )
+
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+            collection = client.get_or_create_collection("bench")
+            keyword_index = KeywordIndex(Path(path) / 'keywords.sqlite3')
+            for document_id, chunks in documents.items():
+                write_batches(
+                    collection, embed_in_batches(chunks, provider, settings.VECTORDB_BATCH_SIZE), document_id,
+                    on_write=lambda ids, texts, document_id=document_id: keyword_index.add(
+                        CONVERSATION_ID, document_id, ids, texts
+                    )
+                )
+
+            for mode in ('vector', 'keyword', 'hybrid'):
+                self._run(mode, collection, keyword_index, provider, queries, options['k'])
+
+    def _corpus(self, rng: random.Random, documents: int, chunks_per_document: int) -> dict:
+        corpus = {}
+        for number in range(documents):
+            chunks = synthetic_chunks(chunks_per_document, seed=number)
+            for index in range(len(chunks)):
+                if rng.random() < 0.3:
+                    code = f"INV-{number:03d}-{index:05d}"
+                    chunks[index] = f"{chunks[index]} invoice {code} is settled"
+            corpus[f"doc{number}"] = chunks
+        return corpus
+
+    def _codes(self, documents: dict) -> dict:
+        codes = {}
+        for document_id, chunks in documents.items():
+            for index, chunk in enumerate(chunks):
+                if " invoice INV-" in chunk:
+                    codes[f"{document_id}_{index}"] = chunk.rsplit(" invoice ", 1)[1].split()[0]
+        return codes
+
+    def _run(self, mode: str, collection, keyword_index, provider, queries, k: int):
+        found = 0
+        latencies = []
+        for chunk_id, code in queries:
+            question = f"What is the status of invoice {code}?"
+            start = time.perf_counter()
+            if mode == 'keyword':
+                ranked = [hit for hit, _ in keyword_index.search(CONVERSATION_ID, question, limit=k)]
+            else:
+                ranked, _ = hybrid_search(
+                    collection, provider.embed_query(question), None,
+                    keyword_index if mode == 'hybrid' else None, CONVERSATION_ID, question,
+                    candidates=settings.RETRIEVAL_CANDIDATES, rrf_k=settings.RETRIEVAL_RRF_K
+                )
+            latencies.append(time.perf_counter() - start)
+            found += chunk_id in ranked[:k]
+
+        self.stdout.write(
+            f"{mode:<8} recall {found / len(queries):6.3f}  "
+            f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p95 {percentile(latencies, 95) * 1000:7.2f} ms"
+        )
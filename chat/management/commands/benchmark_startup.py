@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.benchmarking import percentile, timed
+
+
+SETUP = "import django; django.setup(); "
+
+# Each scenario runs in a fresh interpreter, so import and initialization costs are included
+SCENARIOS = {
+    'manage.py check': [sys.executable, 'manage.py', 'check'],
+    'web worker boot': [sys.executable, '-c', SETUP + "import aichat.urls"],
+    'ingest worker boot': [
+        sys.executable, '-c', SETUP + "from chat.ai_service import get_ai_service; get_ai_service()"
+    ],
+    'boot + prewarm': [
+        sys.executable, '-c', SETUP + "import aichat.urls; from chat.ai_service import get_ai_service; "
+        "get_ai_service().warmup()"
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = "Measure process startup time of management commands and web/ingestion workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'aichat.settings'),
+            # Pre-warming is measured explicitly, not as a side effect of app loading
+            'AI_SERVICE_PREWARM': '0',
+        }
+        for name in options['scenarios']:
+            durations = []
+            for _ in range(max(1, options['runs'])):
+                result, elapsed = timed(
+                    subprocess.run, SCENARIOS[name], cwd=settings.BASE_DIR, env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+                )
+                if result.returncode != 0:
+                    raise CommandError(f"{name} failed:\n{result.stderr}")
+                durations.append(elapsed)
+            self.stdout.write(
+                f"{name:<20} median {percentile(durations, 50) * 1000:8.0f} ms  "
+                f"min {min(durations) * 1000:8.0f} ms  max {max(durations) * 1000:8.0f} ms"
+            )
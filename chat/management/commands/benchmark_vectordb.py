@@ -0,0 +1,83 @@
+import random
+import tempfile
+import time
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from chromadb.config import Settings
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.ai_service import write_batches
+from chat.benchmarking import directory_size, percentile, synthetic_chunks, timed
+from chat.embeddings import HashingEmbeddingProvider
+from chat.vector_store import get_vector_index
+
+
+class Command(BaseCommand):
+    help = "Compare per-conversation and shared Chroma layouts: ingest time, startup, query latency, disk use"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=10000)
+        parser.add_argument('--chunks-per-conversation', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--shards', type=int, default=settings.VECTORDB_SHARDS)
+        parser.add_argument('--modes', nargs='+', default=['per_conversation', 'shared'])
+
+    def handle(self, *args, **options):
+        provider = HashingEmbeddingProvider()
+        # A pool of distinct chunks, embedded once and reused so embedding cost stays out of the numbers
+        pool = synthetic_chunks(1000)
+        vectors = provider(pool)
+        self.stdout.write(
+            f"{options['conversations']} conversations x {options['chunks_per_conversation']} chunks, "
+            f"{options['queries']} queries"
+        )
+
+        for mode in options['modes']:
+            with tempfile.TemporaryDirectory() as path:
+                self._run(mode, path, pool, vectors, provider, options)
+
+    def _client(self, path: str):
+        return chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+
+    def _run(self, mode: str, path: str, pool, vectors, provider, options):
+        per_conversation = options['chunks_per_conversation']
+        conversation_ids = [f"bench-{i:06d}" for i in range(options['conversations'])]
+
+        def ingest():
+            index = get_vector_index(self._client(path), provider, mode, options['shards'])
+            for number, conversation_id in enumerate(conversation_ids):
+                start = (number * per_conversation) % (len(pool) - per_conversation)
+                batch = (0, pool[start:start + per_conversation], vectors[start:start + per_conversation])
+                write_batches(
+                    index.collection_for(conversation_id), [batch], f"doc-{number}",
+                    metadata=index.chunk_metadata(conversation_id)
+                )
+
+        _, ingest_seconds = timed(ingest)
+
+        # Drop the cached client so startup includes opening the persisted indexes again
+        SharedSystemClient.clear_system_cache()
+        rng = random.Random(0)
+        queries = [(rng.choice(conversation_ids), rng.choice(pool)) for _ in range(options['queries'])]
+        start = time.perf_counter()
+        index = get_vector_index(self._client(path), provider, mode, options['shards'])
+        first_query = None
+        latencies = []
+        for conversation_id, text in queries:
+            query_start = time.perf_counter()
+            index.find_collection(conversation_id).query(
+                query_embeddings=provider([text]), n_results=5,
+                where=index.where(conversation_id)
+            )
+            latencies.append(time.perf_counter() - query_start)
+            if first_query is None:
+                first_query = time.perf_counter() - start
+
+        collections = len(index.client.list_collections())
+        SharedSystemClient.clear_system_cache()
+        self.stdout.write(
+            f"{mode:<17} collections {collections:6d}  ingest {ingest_seconds:8.1f}s  "
+            f"startup+first query {first_query * 1000:8.1f} ms  "
+            f"query p50 {percentile(latencies, 50) * 1000:7.2f} ms  p95 {percentile(latencies, 95) * 1000:7.2f} ms  "
+            f"disk {directory_size(path) / 2 ** 20:8.1f} MiB"
+        )
@@ -0,0 +1,59 @@
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(poll_interval: float):
+    """Entry point of a spawned worker process"""
+    import django
+    django.setup()
+    
+    from chat.ai_service import get_ai_service
+    from chat.ingestion import run_worker
+    service = get_ai_service()
+    if settings.AI_SERVICE_PREWARM:
+        service.warmup()
+    try:
+        run_worker(service, poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that ingest pending uploaded documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.INGESTION_WORKER_PROCESSES,
+            help="Number of worker processes to run"
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.INGESTION_POLL_INTERVAL,
+            help="Seconds to wait between polls when the queue is empty"
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        self.stdout.write(f"Starting {processes} ingestion worker(s)")
+        
+        # Workers open their own connections; never share one across processes
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=_worker_main, args=(poll_interval,), name=f'ingest-worker-{i}')
+            for i in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping ingestion workers")
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.vector_store import CONVERSATION_PREFIX, SharedIndex, fold_conversation_collection, get_chroma_client
+
+
+class Command(BaseCommand):
+    help = "Fold per-conversation Chroma collections into the shared, metadata-filtered collections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=settings.VECTORDB_SHARDS)
+        parser.add_argument('--batch-size', type=int, default=settings.VECTORDB_BATCH_SIZE)
+        parser.add_argument(
+            '--delete', action='store_true',
+            help="Delete each per-conversation collection once it has been copied"
+        )
+
+    def handle(self, *args, **options):
+        client = get_chroma_client()
+        # Embeddings are copied as stored, so no embedding function is needed
+        index = SharedIndex(client, None, options['shards'])
+        batch_size = max(1, min(options['batch_size'], client.get_max_batch_size()))
+
+        # chromadb < 0.6 returns Collection objects, later versions return names
+        names = [getattr(collection, 'name', collection) for collection in client.list_collections()]
+        names = [name for name in names if name.startswith(CONVERSATION_PREFIX)]
+        self.stdout.write(f"Found {len(names)} per-conversation collections")
+
+        total = 0
+        for position, name in enumerate(names, 1):
+            total += fold_conversation_collection(client, name, index, batch_size, options['delete'])
+            if position % 500 == 0:
+                self.stdout.write(f"  {position}/{len(names)} collections, {total} chunks")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {total} chunks into {index.shards} shared collection(s). "
+            f"Set VECTORDB_INDEX_MODE=shared to use them."
+        ))
@@ -0,0 +1,42 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Run the Chroma server that owns VECTORDB_PATH for workers started with VECTORDB_MODE=server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.VECTORDB_HOST)
+        parser.add_argument('--port', type=int, default=settings.VECTORDB_PORT)
+
+    def _chroma_executable(self) -> str:
+        # Prefer the CLI installed alongside this interpreter, i.e. in the same virtualenv
+        local = Path(sys.executable).with_name('chroma')
+        executable = str(local) if local.exists() else shutil.which('chroma')
+        if not executable:
+            raise CommandError("The 'chroma' command was not found; is chromadb installed?")
+        return executable
+
+    def handle(self, *args, **options):
+        settings.VECTORDB_PATH.mkdir(exist_ok=True)
+        command = [
+            self._chroma_executable(), 'run',
+            '--path', str(settings.VECTORDB_PATH),
+            '--host', options['host'],
+            '--port', str(options['port']),
+        ]
+        self.stdout.write(f"Serving {settings.VECTORDB_PATH} on {options['host']}:{options['port']}")
+
+        server = subprocess.Popen(command)
+        try:
+            server.wait()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping vector store server")
+            server.terminate()
+            server.wait()
+        if server.returncode not in (0, -15):
+            raise CommandError(f"Vector store server exited with status {server.returncode}")
@@ -0,0 +1,230 @@
+"""
+Process-local metrics, served in the Prometheus text format at ``/metrics``.
+
+- ``aichat_stage_duration_seconds{stage}``: latency of each pipeline stage
+  (retrieval, prompt assembly, LLM calls, vector and database writes, upload
+  and ingestion steps)
+- ``aichat_errors_total{stage}``: stages that raised
+- ``aichat_cache_requests_total{cache,result}``: hits and misses of every cache
+- ``aichat_llm_tokens_total{kind}`` and ``aichat_llm_request_tokens{kind}``:
+  prompt and completion tokens, in total and per LLM request
+- ``aichat_http_request_duration_seconds{view,method,status}``: per-view
+  latency, recorded by ``MetricsMiddleware``
+
+Values are kept per process; with several workers, scrape each of them (or
+run one worker while load testing).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, count, sum)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[1] if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((key, (list(counts), count, total)) for key, (counts, count, total) in self._series.items())
+        for key, (counts, count, total) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+
+
+class Registry:
+    """Metrics of this process, plus collectors reporting values read at scrape time"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], List[Tuple[str, str, str, Dict[str, str], float]]]):
+        """`collect` returns (name, type, help, labels, value) samples"""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        described = set()
+        for collect in self.collectors:
+            try:
+                samples = collect()
+            except Exception:
+                continue
+            for name, kind, documentation, labels, value in samples:
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'aichat_stage_duration_seconds', 'Duration of chat and ingestion pipeline stages', ['stage']
+))
+ERRORS = REGISTRY.register(Counter('aichat_errors_total', 'Pipeline stages that raised', ['stage']))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'aichat_cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result']
+))
+TOKENS = REGISTRY.register(Counter('aichat_llm_tokens_total', 'Tokens sent to and received from the LLM', ['kind']))
+REQUEST_TOKENS = REGISTRY.register(Histogram(
+    'aichat_llm_request_tokens', 'Tokens per LLM request', ['kind'], buckets=TOKEN_BUCKETS
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    'aichat_http_request_duration_seconds', 'Latency of API views', ['view', 'method', 'status']
+))
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage, counting it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        # Cancellations and closed generators (client disconnects) aren't errors
+        ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def cache_lookup(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_REQUESTS.inc(count, cache=cache, result='hit' if hit else 'miss')
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    for kind, tokens in (('prompt', prompt_tokens), ('completion', completion_tokens)):
+        TOKENS.inc(tokens, kind=kind)
+        REQUEST_TOKENS.observe(tokens, kind=kind)
+
+
+class MetricsMiddleware:
+    """Records the latency of every request by resolved view name, for sync and async views alike"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    async def _acall(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    @staticmethod
+    def _record(request, response, start: float):
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths are lumped together so scanners can't grow the label set
+        view = match.url_name or match.view_name if match else 'unresolved'
+        HTTP_SECONDS.observe(
+            time.perf_counter() - start, view=view, method=request.method, status=response.status_code
+        )
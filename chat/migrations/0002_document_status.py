@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:23
+
+from django.db import migrations, models
+
+
+def mark_existing_documents_ready(apps, schema_editor):
+    # Documents uploaded before the ingestion queue were processed inline
+    Document = apps.get_model('chat', 'Document')
+    Document.objects.update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('extracting', 'Extracting'), ('embedding', 'Embedding'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_documents_ready, migrations.RunPython.noop),
+    ]
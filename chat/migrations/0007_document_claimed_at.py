@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -7,9 +7,16 @@ class Conversation(models.Model):
     session_id = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Rolling summary of every message up to and including summarized_through_id
+    summary = models.TextField(blank=True, default='')
+    summarized_through_id = models.BigIntegerField(default=0)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the conversations listing
+            models.Index(fields=['created_at', 'id'], name='chat_conv_created_id'),
+        ]
 
 
 class Message(models.Model):
@@ -26,6 +33,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination of a conversation's messages
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='chat_msg_conv_ts_id'),
+        ]
 
 
 class Document(models.Model):
@@ -35,12 +46,43 @@ class Document(models.Model):
         ('image', 'Image'),
     ]
     
+    STATUS_PENDING = 'pending'
+    STATUS_EXTRACTING = 'extracting'
+    STATUS_EMBEDDING = 'embedding'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_EXTRACTING, 'Extracting'),
+        (STATUS_EMBEDDING, 'Embedding'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='documents', null=True, blank=True)
     file = models.FileField(upload_to='documents/')
     file_type = models.CharField(max_length=10, choices=DOCUMENT_TYPES)
     original_filename = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(default=timezone.now)
     processed_content = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error = models.TextField(blank=True, default='')
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Set when an ingestion worker claims the document and refreshed while it works on it
+    claimed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-uploaded_at']
+
+
+class UploadSession(models.Model):
+    """A resumable upload, written chunk by chunk straight to its final media path"""
+    upload_id = models.CharField(max_length=32, unique=True)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='uploads')
+    file = models.FileField(upload_to='documents/')
+    file_type = models.CharField(max_length=10, choices=Document.DOCUMENT_TYPES)
+    original_filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,179 @@
+"""
+OCR of uploaded images and scanned PDF pages.
+
+Images are prepared the way Tesseract reads best: scaled so a page-wide line
+of text sits at ``dpi`` (phone photos are usually far above it, which only
+makes OCR slower), converted to grayscale and binarized with Otsu's
+threshold. Tall images are cut into strips at blank rows and the strips are
+recognised in parallel in a process pool.
+
+Functions here run inside a process pool, so they are kept at module level and
+free of Django imports.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+
+# Width of the text block of a letter/A4 page, used to turn a DPI into pixels
+PAGE_WIDTH_INCHES = 8.5
+# Strips are cut at the blankest row within this fraction of a strip's end
+CUT_WINDOW = 0.15
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Grey level separating ink from paper, maximising the between-class variance"""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = background_sum = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background
+        foreground_mean = (weighted_total - background_sum) / foreground
+        variance = background * foreground * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def prepare_image(img, dpi: int):
+    """Grayscale, binarized copy of the image, downscaled to the OCR resolution"""
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Transparent areas become paper rather than black
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img.convert('RGBA'), mask=img.convert('RGBA').getchannel('A'))
+        img = background
+    img = img.convert('L')
+
+    max_width = int(PAGE_WIDTH_INCHES * dpi)
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+
+    threshold = otsu_threshold(img.histogram())
+    return img.point(lambda level: 255 if level > threshold else 0, mode='1')
+
+
+def strip_bounds(img, tile_height: int) -> List[Tuple[int, int]]:
+    """(top, bottom) rows of horizontal strips, each cut at the blankest row near its end"""
+    from PIL import Image
+    if img.height <= tile_height * 1.5:
+        return [(0, img.height)]
+    # Mean brightness of every row: blank rows between text lines are the brightest
+    rows = list(img.convert('L').resize((1, img.height), Image.BOX).getdata())
+    window = max(1, int(tile_height * CUT_WINDOW))
+    bounds = []
+    top = 0
+    while img.height - top > tile_height * 1.5:
+        end = top + tile_height
+        cut = max(range(end - window, end + 1), key=lambda row: rows[row])
+        bounds.append((top, cut))
+        top = cut
+    bounds.append((top, img.height))
+    return bounds
+
+
+def recognise(mode: str, size: Tuple[int, int], data: bytes, lang: str) -> str:
+    """OCR one prepared image strip; the unit of work sent to the pool"""
+    import pytesseract
+    from PIL import Image
+    return pytesseract.image_to_string(Image.frombytes(mode, size, data), lang=lang).strip()
+
+
+def ocr_prepared(img, lang: str) -> str:
+    """OCR an image already passed through prepare_image, in the calling process"""
+    import pytesseract
+    return pytesseract.image_to_string(img, lang=lang).strip()
+
+
+def _limit_tesseract_threads():
+    # Parallelism comes from the pool; Tesseract's own OpenMP threads would oversubscribe the CPUs
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool, created on first use so worker start-up is paid once"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn rather than fork: callers may be multi-threaded web or ingestion processes
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_limit_tesseract_threads
+            )
+            _pool_workers = workers
+        return _pool
+
+
+class OCREngine:
+    """
+    Prepares, tiles and recognises images, caching the text by image content.
+
+    With `workers` > 1 the strips of a tall image are recognised in a
+    process pool; otherwise everything runs in the calling thread.
+    """
+
+    def __init__(self, dpi: int = 300, tile_height: int = 2000, workers: int = 1,
+                 lang: str = 'eng', cache=None):
+        self.dpi = dpi
+        self.tile_height = tile_height
+        self.workers = workers
+        self.lang = lang
+        self.cache = cache
+
+    @property
+    def fingerprint(self) -> str:
+        """Settings that change the recognised text, so cached results are never mixed across them"""
+        return f"{self.dpi}-{self.tile_height}-{self.lang}"
+
+    def cache_key(self, file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return f"{digest.hexdigest()}-{self.fingerprint}"
+
+    def image_to_text(self, file_path: str) -> str:
+        """Text of the image file, from the cache when the same image was recognised before"""
+        key = self.cache_key(file_path) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        from PIL import Image
+        with Image.open(file_path) as img:
+            text = self.recognise(img)
+        if key:
+            self.cache.set(key, text)
+        return text
+
+    def recognise(self, img) -> str:
+        prepared = prepare_image(img, self.dpi)
+        bounds = strip_bounds(prepared, self.tile_height)
+        if self.workers <= 1 or len(bounds) == 1:
+            return "\n".join(ocr_prepared(prepared.crop((0, top, prepared.width, bottom)), self.lang)
+                             for top, bottom in bounds)
+
+        pool = _get_pool(self.workers)
+        futures = []
+        for top, bottom in bounds:
+            strip = prepared.crop((0, top, prepared.width, bottom))
+            futures.append(pool.submit(recognise, strip.mode, strip.size, strip.tobytes(), self.lang))
+        return "\n".join(future.result() for future in futures)
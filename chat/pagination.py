@@ -0,0 +1,58 @@
+"""
+Keyset (cursor) pagination for the API.
+
+A cursor is an opaque, URL-safe token holding the sort key of the last row of
+a page, e.g. (created_at, id). The next page is the rows strictly after that
+key in the listing's order, so pages stay stable while rows are added and
+every page costs one indexed query regardless of how deep it is.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, pk: int) -> str:
+    payload = json.dumps([timestamp.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[object, int]:
+    """(timestamp, pk) from a cursor made by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        parsed = parse_datetime(timestamp)
+        if parsed is None:
+            raise ValueError(timestamp)
+        return parsed, int(pk)
+    except (ValueError, TypeError, UnicodeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {token}") from e
+
+
+def page_size(value: Optional[str], default: int, maximum: int) -> int:
+    """The requested page size, clamped to 1..maximum"""
+    try:
+        return max(1, min(int(value), maximum)) if value else default
+    except ValueError:
+        return default
+
+
+def after(field: str, timestamp, pk: int) -> Q:
+    """Rows after (timestamp, pk) in ascending (field, id) order"""
+    return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+
+
+def before(field: str, timestamp, pk: int) -> Q:
+    """Rows before (timestamp, pk) in ascending (field, id) order"""
+    return Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk})
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, bool]:
+    """Rows of a page fetched with limit + 1, and whether there are more"""
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,207 @@
+"""
+Reuse of assembled prompt prefixes across chat turns.
+
+The system prompt of a turn is fully determined by the retrieved chunks and
+the conversation summary, and in document-heavy sessions consecutive turns
+usually retrieve the same chunks. ``PromptPrefixCache`` keeps recently built
+prefixes keyed by (chunk ids, summary) and hands back the same prefix when
+they repeat, so it is built once rather than on every turn.
+
+Where the provider supports it, a reused prefix is also uploaded once as a
+provider-side context cache (``PROMPT_CONTEXT_CACHE``):
+
+- ``none``: local reuse only
+- ``gemini``: Gemini context caching, for prefixes of at least
+  ``PROMPT_CONTEXT_CACHE_MIN_TOKENS`` tokens (the API's minimum)
+- ``fake``: records what would be cached, for tests with a fake LLM
+"""
+import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from django.conf import settings
+from .history import count_tokens
+from .metrics import cache_lookup
+
+
+logger = logging.getLogger(__name__)
+
+
+class PromptPrefix:
+    """An assembled system prompt, plus the provider-side cache holding it if one was created"""
+
+    def __init__(self, key: str, system_prompt: str, cached_content: Optional[str] = None):
+        from langchain_core.messages import SystemMessage
+        self.key = key
+        self.system_message = SystemMessage(content=system_prompt)
+        self.cached_content = cached_content
+        self.created = time.time()
+
+    @property
+    def llm_kwargs(self) -> dict:
+        """Extra arguments for the LLM call when the prefix lives in a provider-side cache"""
+        return {'cached_content': self.cached_content} if self.cached_content else {}
+
+
+class ContextCacheProvider:
+    """Provider-side caching of prompt prefixes; the base class caches nothing"""
+
+    name = 'none'
+
+    def create(self, system_prompt: str) -> Optional[str]:
+        """Upload a prefix, returning the provider's handle for it (or None if not cached)"""
+        return None
+
+    def release(self, handle: str):
+        pass
+
+
+def model_resource(model: str) -> str:
+    """API resource name of a model, whether or not it already has the models/ prefix"""
+    return model if model.startswith('models/') else f"models/{model}"
+
+
+class GeminiContextCache(ContextCacheProvider):
+    name = 'gemini'
+
+    def __init__(self, model: str, api_key: str, ttl: float, min_tokens: int):
+        # The google-genai client is what langchain-google-genai itself talks to
+        from google import genai
+        from google.genai import types
+        self.types = types
+        self.client = genai.Client(api_key=api_key)
+        self.model = model_resource(model)
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+
+    def create(self, system_prompt: str) -> Optional[str]:
+        if count_tokens(system_prompt) < self.min_tokens:
+            # Below the API's minimum, the prefix is only reused locally
+            return None
+        cached = self.client.caches.create(model=self.model, config=self.types.CreateCachedContentConfig(
+            system_instruction=system_prompt,
+            ttl=f"{int(self.ttl)}s"
+        ))
+        return cached.name
+
+    def release(self, handle: str):
+        self.client.caches.delete(name=handle)
+
+
+class FakeContextCache(ContextCacheProvider):
+    """Keeps "uploaded" prefixes in memory so tests can see what would have been cached"""
+
+    name = 'fake'
+
+    def __init__(self):
+        self.contents = {}
+        self.created = 0
+        self.released = 0
+        self._lock = threading.Lock()
+
+    def create(self, system_prompt: str) -> Optional[str]:
+        with self._lock:
+            self.created += 1
+            handle = f"cachedContents/fake-{self.created}"
+            self.contents[handle] = system_prompt
+        return handle
+
+    def release(self, handle: str):
+        with self._lock:
+            self.released += 1
+            self.contents.pop(handle, None)
+
+
+def get_context_cache_provider(name: str = None, model: str = '') -> ContextCacheProvider:
+    """Build the provider-side context cache selected in settings (or by name)"""
+    name = name or settings.PROMPT_CONTEXT_CACHE
+    if name == 'none':
+        return ContextCacheProvider()
+    if name == 'gemini':
+        try:
+            return GeminiContextCache(
+                settings.PROMPT_CONTEXT_CACHE_MODEL or model, settings.GEMINI_API_KEY,
+                settings.PROMPT_CACHE_TTL, settings.PROMPT_CONTEXT_CACHE_MIN_TOKENS
+            )
+        except Exception as e:
+            # Prompts are still reused locally, just not uploaded
+            logger.error("Error creating the gemini context cache client, caching prompts locally only: %s", e)
+            return ContextCacheProvider()
+    if name == 'fake':
+        return FakeContextCache()
+    raise ValueError(f"Unknown prompt context cache: {name}")
+
+
+class PromptPrefixCache:
+    """
+    In-process LRU of assembled prompt prefixes.
+
+    Entries live at most `ttl` seconds, which should not exceed the lifetime
+    of the provider-side caches they point to. Evicted entries release their
+    provider-side cache.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, provider: ContextCacheProvider = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.provider = provider or ContextCacheProvider()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(chunk_ids: List[str], history_summary: str) -> str:
+        return hashlib.sha256("\0".join([*chunk_ids, "", history_summary]).encode('utf-8')).hexdigest()
+
+    def get(self, chunk_ids: List[str], history_summary: str, build: Callable[[], str]) -> PromptPrefix:
+        """The prefix for these chunks and summary, built with `build` only if it isn't cached"""
+        key = self.key(chunk_ids, history_summary)
+        now = time.time()
+        with self._lock:
+            prefix = self._entries.get(key)
+            if prefix is not None and now - prefix.created < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookup('prompt', True)
+                return prefix
+            self.misses += 1
+        cache_lookup('prompt', False)
+
+        system_prompt = build()
+        cached_content = None
+        try:
+            cached_content = self.provider.create(system_prompt)
+        except Exception as e:
+            logger.error("Error creating %s context cache: %s", self.provider.name, e)
+        prefix = PromptPrefix(key, system_prompt, cached_content)
+
+        with self._lock:
+            # An expired entry, or one built concurrently by another thread, is replaced
+            replaced = self._entries.pop(key, None)
+            stale = [replaced] if replaced is not None else []
+            self._entries[key] = prefix
+            while len(self._entries) > self.max_entries:
+                stale.append(self._entries.popitem(last=False)[1])
+        for old in stale:
+            self._release(old)
+        return prefix
+
+    def _release(self, prefix: PromptPrefix):
+        if not prefix.cached_content:
+            return
+        try:
+            self.provider.release(prefix.cached_content)
+        except Exception as e:
+            logger.error("Error releasing %s context cache: %s", self.provider.name, e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'provider': self.provider.name,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,218 @@
+"""
+Hybrid keyword + vector retrieval.
+
+Every chunk written to the vector store is also added to a SQLite FTS5 index
+(an inverted index ranked with BM25), so exact terms such as invoice numbers
+or clause ids are found even when they barely move the embedding. A question
+is run against both, the two rankings are fused with reciprocal rank fusion,
+adjacent chunks of a document are merged back together (dropping the text
+they share through the splitter's overlap), and the passages are trimmed to a
+token budget.
+"""
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from .history import count_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+# Identifiers like INV-2023-001 or clause_4 stay single tokens
+TOKENIZER = "unicode61 tokenchars '-_'"
+QUERY_TERM = re.compile(r"[\w][\w.\-/]*")
+
+
+def keyword_query(text: str) -> str:
+    """FTS5 query matching chunks that contain any term of the text"""
+    terms = dict.fromkeys(term.strip('.-/').lower() for term in QUERY_TERM.findall(text))
+    # Quoting makes terms such as 4.2 phrase queries instead of FTS5 syntax
+    return " OR ".join(f'"{term}"' for term in terms if term)
+
+
+class KeywordIndex:
+    """
+    SQLite FTS5 index of chunk texts, filtered by conversation and document.
+
+    Shared by every process on the host and updated incrementally as chunks
+    are written. ``chunk_rows`` maps chunk ids to their FTS rows, so writing a
+    chunk again (a document ingested twice) replaces its row.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                "text, chunk_id UNINDEXED, conversation_id UNINDEXED, document_id UNINDEXED, "
+                f"tokenize=\"{TOKENIZER}\")"
+            )
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                mapped = connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_rows'"
+                ).fetchone()
+                if not mapped:
+                    connection.execute("CREATE TABLE chunk_rows (chunk_id TEXT PRIMARY KEY, fts_rowid INTEGER NOT NULL)")
+                    # Indexes written before the mapping existed may hold a chunk more than once
+                    connection.execute("INSERT OR REPLACE INTO chunk_rows SELECT chunk_id, rowid FROM chunks")
+                    connection.execute("DELETE FROM chunks WHERE rowid NOT IN (SELECT fts_rowid FROM chunk_rows)")
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            self._local.connection = connection
+        return connection
+
+    def add(self, conversation_id: str, document_id: str, chunk_ids: List[str], texts: List[str]):
+        connection = self._connection()
+        # One transaction per batch rather than one per row. IMMEDIATE takes the write
+        # lock up front: FTS5 reads before it writes, and upgrading a deferred read
+        # transaction fails with "database is locked" without waiting out the timeout
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # A chunk written again replaces its row, so BM25 never ranks a chunk twice
+            connection.executemany(
+                "DELETE FROM chunks WHERE rowid IN (SELECT fts_rowid FROM chunk_rows WHERE chunk_id = ?)",
+                [(chunk_id,) for chunk_id in chunk_ids]
+            )
+            for chunk_id, text in zip(chunk_ids, texts):
+                row = connection.execute(
+                    "INSERT INTO chunks (text, chunk_id, conversation_id, document_id) VALUES (?, ?, ?, ?)",
+                    (text, chunk_id, conversation_id, document_id)
+                ).lastrowid
+                connection.execute("INSERT OR REPLACE INTO chunk_rows (chunk_id, fts_rowid) VALUES (?, ?)",
+                                   (chunk_id, row))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def search(self, conversation_id: str, query: str, document_ids: Optional[List[str]] = None,
+               limit: int = 20) -> List[Tuple[str, str]]:
+        """(chunk_id, text) of the best BM25 matches, best first"""
+        match = keyword_query(query)
+        if not match:
+            return []
+        sql = "SELECT chunk_id, text FROM chunks WHERE chunks MATCH ? AND conversation_id = ?"
+        params = [match, conversation_id]
+        if document_ids:
+            sql += f" AND document_id IN ({','.join('?' * len(document_ids))})"
+            params.extend(document_ids)
+        # bm25() is lower for better matches
+        sql += " ORDER BY bm25(chunks) LIMIT ?"
+        params.append(limit)
+        return self._connection().execute(sql, params).fetchall()
+
+    def delete_conversation(self, conversation_id: str):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM chunk_rows WHERE fts_rowid IN (SELECT rowid FROM chunks WHERE conversation_id = ?)",
+                (conversation_id,)
+            )
+            connection.execute("DELETE FROM chunks WHERE conversation_id = ?", (conversation_id,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merge rankings of ids, scoring each id by the sum of 1 / (k + rank) over the rankings"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+def chunk_position(chunk_id: str) -> Tuple[str, int]:
+    """(document_id, chunk_index) from a chunk id written by write_batches"""
+    document_id, _, index = chunk_id.rpartition('_')
+    return document_id, int(index)
+
+
+def _join_overlapping(first: str, second: str, max_overlap: int) -> str:
+    """Concatenate two consecutive chunks, dropping the text the splitter repeated in both"""
+    for size in range(min(max_overlap, len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def merge_adjacent(ranked_ids: List[str], texts: Dict[str, str],
+                   max_overlap: int) -> List[Tuple[List[str], str]]:
+    """
+    Group ranked chunks into passages of consecutive chunks of the same
+    document, ordered by the rank of their best chunk.
+    """
+    positions = {chunk_id: chunk_position(chunk_id) for chunk_id in ranked_ids}
+    selected = set(positions.values())
+    passages = []
+    placed = set()
+    for chunk_id in ranked_ids:
+        if chunk_id in placed:
+            continue
+        document_id, index = positions[chunk_id]
+        # Walk back and forward over neighbours that were also retrieved
+        start = index
+        while (document_id, start - 1) in selected:
+            start -= 1
+        end = index
+        while (document_id, end + 1) in selected:
+            end += 1
+        members = [f"{document_id}_{i}" for i in range(start, end + 1)]
+        text = texts[members[0]]
+        for member in members[1:]:
+            text = _join_overlapping(text, texts[member], max_overlap)
+        placed.update(members)
+        passages.append((members, text))
+    return passages
+
+
+def trim_to_budget(passages: List[Tuple[List[str], str]], max_tokens: int) -> List[Tuple[List[str], str]]:
+    """Keep passages in order while they fit in the token budget, skipping any that don't"""
+    kept = []
+    used = 0
+    for members, text in passages:
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            continue
+        kept.append((members, text))
+        used += tokens
+    return kept
+
+
+def hybrid_search(collection, query_embedding: List[float], where: Optional[dict],
+                  keyword_index: Optional[KeywordIndex], conversation_id: str, query: str,
+                  document_ids: Optional[List[str]] = None, candidates: int = 20,
+                  rrf_k: int = 60) -> Tuple[List[str], Dict[str, str]]:
+    """Fused ranking of chunk ids from the vector and keyword indexes, and the texts of those chunks"""
+    results = collection.query(query_embeddings=[query_embedding], n_results=candidates, where=where)
+    vector_ids = results['ids'][0] if results['ids'] else []
+    texts = dict(zip(vector_ids, results['documents'][0] if results['documents'] else []))
+    if keyword_index is None:
+        return vector_ids, texts
+
+    try:
+        keyword_hits = keyword_index.search(conversation_id, query, document_ids, candidates)
+    except Exception as e:
+        logger.warning("Keyword search failed, using vector results only: %s", e)
+        return vector_ids, texts
+    for chunk_id, text in keyword_hits:
+        texts.setdefault(chunk_id, text)
+    ranked = reciprocal_rank_fusion([vector_ids, [chunk_id for chunk_id, _ in keyword_hits]], rrf_k)
+    return ranked, texts
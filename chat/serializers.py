@@ -11,7 +11,7 @@ class MessageSerializer(serializers.ModelSerializer):
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = ['id', 'file', 'file_type', 'original_filename', 'uploaded_at']
+        fields = ['id', 'file', 'file_type', 'original_filename', 'uploaded_at', 'status', 'error']
 
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -23,6 +23,30 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['id', 'session_id', 'created_at', 'updated_at', 'messages', 'documents']
 
 
+class ConversationDetailSerializer(serializers.ModelSerializer):
+    """Conversation with its documents; messages are paged separately"""
+    documents = DocumentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'session_id', 'created_at', 'updated_at', 'documents']
+
+
+class ConversationSummarySerializer(serializers.ModelSerializer):
+    """Listing entry; the counts and preview are annotated by the listing query"""
+    message_count = serializers.IntegerField(read_only=True)
+    document_count = serializers.IntegerField(read_only=True)
+    last_message = serializers.CharField(read_only=True, allow_null=True)
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'session_id', 'created_at', 'updated_at',
+            'message_count', 'document_count', 'last_message', 'last_message_at'
+        ]
+
+
 class ChatRequestSerializer(serializers.Serializer):
     message = serializers.CharField(max_length=1000)
     session_id = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
@@ -31,3 +55,9 @@ class ChatRequestSerializer(serializers.Serializer):
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
     session_id = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+
+
+class UploadStartSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    session_id = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from google.genai.errors import ClientError, ServerError
+from langchain_core.messages import AIMessage, HumanMessage
+from .ai_service import LLMGateway, is_retryable
+from .benchmarking import synthetic_chunks
+from .history import aget_history, fold_history, message_tokens, prompt_budget
+from .ingestion import claim_document, ingest_document
+from .llms import FakeChatModel
+from .models import Conversation, Document, Message
+from .prompt_cache import (
+    ContextCacheProvider, FakeContextCache, GeminiContextCache, PromptPrefixCache, get_context_cache_provider,
+    model_resource
+)
+from .retrieval import KeywordIndex
+
+
+class HistoryQueryCountTests(TestCase):
+    """The conversation detail and message endpoints run a fixed number of queries however long the history is"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.short = cls._conversation('short-history', 5)
+        cls.long = cls._conversation('long-history', 500)
+
+    @staticmethod
+    def _conversation(session_id: str, size: int) -> Conversation:
+        conversation = Conversation.objects.create(session_id=session_id)
+        start = timezone.now() - timedelta(seconds=size)
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                message_type='user' if index % 2 == 0 else 'assistant',
+                content=text,
+                timestamp=start + timedelta(seconds=index)
+            )
+            for index, text in enumerate(synthetic_chunks(size, chars=200))
+        ])
+        Document.objects.bulk_create([
+            Document(
+                conversation=conversation, file=f'documents/{session_id}-{index}.pdf', file_type='pdf',
+                original_filename=f'{session_id}-{index}.pdf', status=Document.STATUS_READY
+            )
+            for index in range(3)
+        ])
+        return conversation
+
+    def _get(self, url: str) -> dict:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_detail(self):
+        # Conversation, its documents and one page of messages
+        for conversation in (self.short, self.long):
+            with self.subTest(session_id=conversation.session_id), self.assertNumQueries(3):
+                self._get(f'/api/conversations/{conversation.session_id}/')
+
+    def test_messages(self):
+        # Conversation id and one page of messages
+        for conversation in (self.short, self.long):
+            with self.subTest(session_id=conversation.session_id), self.assertNumQueries(2):
+                self._get(f'/api/conversations/{conversation.session_id}/messages/')
+
+    def test_older_page(self):
+        older_cursor = self._get(f'/api/conversations/{self.long.session_id}/')['older_cursor']
+        self.assertIsNotNone(older_cursor)
+        with self.assertNumQueries(2):
+            page = self._get(f'/api/conversations/{self.long.session_id}/messages/?before={older_cursor}')
+        self.assertEqual(len(page['messages']), settings.MESSAGES_PAGE_SIZE)
+
+
+class HistoryWindowTests(TestCase):
+    def _conversation(self, size: int, chars: int) -> Conversation:
+        conversation = Conversation.objects.create(session_id=f'history-{size}-{chars}')
+        Message.objects.bulk_create([
+            Message(conversation=conversation, message_type='user' if index % 2 == 0 else 'assistant', content=text)
+            for index, text in enumerate(synthetic_chunks(size, chars=chars))
+        ])
+        return conversation
+
+    @staticmethod
+    def _summarize(summary: str, messages: list) -> str:
+        return f"{summary} {len(messages)} turns".strip()
+
+    def test_short_turns_past_the_row_cap_are_folded(self):
+        # 60 short turns stay far below HISTORY_SUMMARY_MIN_TOKENS, but only 50 rows are sent
+        conversation = self._conversation(60, chars=20)
+        self.assertTrue(fold_history(conversation.id, self._summarize))
+
+        conversation.refresh_from_db()
+        newest_past_cap = conversation.messages.order_by('-id')[settings.HISTORY_MAX_MESSAGES]
+        self.assertEqual(conversation.summarized_through_id, newest_past_cap.id)
+        self.assertEqual(conversation.summary, "10 turns")
+
+    def test_short_turns_within_the_row_cap_wait(self):
+        conversation = self._conversation(20, chars=20)
+        self.assertFalse(fold_history(conversation.id, self._summarize))
+
+    @override_settings(HISTORY_MAX_TOKENS=200, HISTORY_SUMMARY_MIN_TOKENS=100)
+    async def test_prompt_is_trimmed_to_the_token_budget(self):
+        conversation = await sync_to_async(self._conversation)(40, chars=200)
+        summary, messages = await aget_history(conversation)
+
+        self.assertEqual(summary, "")
+        self.assertTrue(messages)
+        self.assertLessEqual(sum(message_tokens(message) for message in messages), prompt_budget())
+        newest = await conversation.messages.order_by('-id').afirst()
+        self.assertEqual(messages[-1]['id'], newest.id)
+
+
+class KeywordIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = KeywordIndex(Path(directory.name) / 'keywords.sqlite3')
+
+    def test_reingested_chunks_are_indexed_once(self):
+        for _ in range(2):
+            self.index.add('conversation', 'doc', ['doc_0', 'doc_1'], ["apple pie recipe", "apple orchard"])
+        hits = self.index.search('conversation', "apple")
+        self.assertCountEqual([chunk_id for chunk_id, _ in hits], ['doc_0', 'doc_1'])
+
+    def test_delete_conversation(self):
+        self.index.add('conversation', 'doc', ['doc_0'], ["apple pie recipe"])
+        self.index.add('other', 'doc2', ['doc2_0'], ["apple pie recipe"])
+        self.index.delete_conversation('conversation')
+        self.assertEqual(self.index.search('conversation', "apple"), [])
+        self.assertEqual(len(self.index.search('other', "apple")), 1)
+
+
+class _BrokenContentCache:
+    def get(self, key):
+        raise OSError("content cache is unreadable")
+
+
+class _BrokenCacheService:
+    ingestion_fingerprint = 'test'
+    content_cache = _BrokenContentCache()
+
+
+class IngestionFailureTests(TestCase):
+    def test_content_cache_error_marks_the_document_failed(self):
+        conversation = Conversation.objects.create(session_id='ingestion-failure')
+        document = Document.objects.create(
+            conversation=conversation, file='documents/report.pdf', file_type='pdf',
+            original_filename='report.pdf', content_hash='abc'
+        )
+        self.assertTrue(claim_document(document.id))
+        ingest_document(document.id, _BrokenCacheService())
+
+        document.refresh_from_db()
+        self.assertEqual(document.status, Document.STATUS_FAILED)
+        self.assertEqual(document.error, "content cache is unreadable")
+        self.assertIsNone(document.claimed_at)
+
+
+class _RateLimitedModel:
+    """Fails like langchain-google-genai on a 429 for the first `failures` calls"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def invoke(self, messages: list, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            try:
+                raise ClientError(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}})
+            except ClientError as e:
+                raise RuntimeError("Error calling model 'gemini-1.5-flash' (RESOURCE_EXHAUSTED)") from e
+        return AIMessage(content="answer")
+
+
+class LLMGatewayTests(SimpleTestCase):
+    def _gateway(self, llm) -> LLMGateway:
+        return LLMGateway(llm, max_in_flight=2, rate=0, burst=1, max_retries=2, backoff=0, max_backoff=0)
+
+    def test_wrapped_rate_limit_is_retried(self):
+        llm = _RateLimitedModel(failures=2)
+        gateway = self._gateway(llm)
+        self.assertEqual(gateway.invoke([HumanMessage(content="question")]).content, "answer")
+        self.assertEqual(llm.calls, 3)
+        self.assertEqual(gateway.stats()['retries'], 2)
+
+    def test_classification(self):
+        def wrapped(code: int) -> Exception:
+            error = RuntimeError("model error")
+            error.__cause__ = (ClientError if code < 500 else ServerError)(code, {'error': {'code': code}})
+            return error
+
+        self.assertTrue(is_retryable(wrapped(429)))
+        self.assertTrue(is_retryable(wrapped(503)))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(wrapped(400)))
+        self.assertFalse(is_retryable(ValueError("bad prompt")))
+
+    async def test_rate_limited_callers_do_not_hold_a_slot(self):
+        gateway = LLMGateway(FakeChatModel(), max_in_flight=1, rate=10, burst=1,
+                             max_retries=0, backoff=0, max_backoff=0)
+        await gateway.ainvoke([HumanMessage(content="first")])
+        # The bucket is empty: the next call waits a tenth of a second for a token
+        waiting = asyncio.create_task(gateway.ainvoke([HumanMessage(content="second")]))
+        await asyncio.sleep(0.02)
+        self.assertEqual(gateway.limiter.in_use, 0)
+        await waiting
+
+
+class PromptPrefixCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.provider = FakeContextCache()
+        self.cache = PromptPrefixCache(max_entries=2, ttl=60, provider=self.provider)
+        self.builds = 0
+
+    def _build(self) -> str:
+        self.builds += 1
+        return f"system prompt {self.builds}"
+
+    def test_repeated_chunks_reuse_the_prefix(self):
+        first = self.cache.get(['doc_1', 'doc_2'], "summary", self._build)
+        second = self.cache.get(['doc_1', 'doc_2'], "summary", self._build)
+        self.assertIs(first, second)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.provider.created, 1)
+        self.assertEqual(second.llm_kwargs, {'cached_content': first.cached_content})
+
+    def test_new_summary_builds_a_new_prefix(self):
+        self.cache.get(['doc_1'], "summary", self._build)
+        self.cache.get(['doc_1'], "longer summary", self._build)
+        self.assertEqual(self.builds, 2)
+
+    def test_evicted_prefixes_release_their_provider_cache(self):
+        first = self.cache.get(['doc_1'], "", self._build)
+        self.cache.get(['doc_2'], "", self._build)
+        self.cache.get(['doc_3'], "", self._build)
+        self.assertEqual(self.provider.released, 1)
+        self.assertNotIn(first.cached_content, self.provider.contents)
+        self.assertEqual(len(self.provider.contents), 2)
+
+    @override_settings(GEMINI_API_KEY='test-key', PROMPT_CONTEXT_CACHE_MODEL='', PROMPT_CONTEXT_CACHE_MIN_TOKENS=32768)
+    def test_gemini_provider(self):
+        provider = get_context_cache_provider('gemini', model='gemini-1.5-flash-001')
+        self.assertIsInstance(provider, GeminiContextCache)
+        self.assertEqual(provider.model, 'models/gemini-1.5-flash-001')
+        # Below the API's minimum size nothing is uploaded
+        self.assertIsNone(provider.create("short system prompt"))
+
+    @override_settings(GEMINI_API_KEY='')
+    def test_gemini_provider_falls_back_to_local_reuse(self):
+        # Without a key in settings the client would look for one in the environment
+        environ = {name: value for name, value in os.environ.items() if name not in ('GOOGLE_API_KEY', 'GEMINI_API_KEY')}
+        with mock.patch.dict(os.environ, environ, clear=True), self.assertLogs('chat.prompt_cache', level='ERROR'):
+            provider = get_context_cache_provider('gemini', model='gemini-1.5-flash-001')
+        self.assertIs(type(provider), ContextCacheProvider)
+
+    def test_model_resource(self):
+        self.assertEqual(model_resource('gemini-1.5-flash-001'), 'models/gemini-1.5-flash-001')
+        self.assertEqual(model_resource('models/gemini-1.5-flash-001'), 'models/gemini-1.5-flash-001')
@@ -0,0 +1,144 @@
+"""
+Resumable chunked uploads.
+
+A client opens an upload with the file's name and size, sends the bytes as
+``Content-Range`` chunks in order, and finalizes it. Chunks are written
+straight into the file's final media path, and the SHA-256 used to dedupe
+ingestion is advanced as they stream through, so finalizing neither copies
+nor re-reads the file; the document is handed to extraction as it lies.
+Memory use is bounded by the copy block size, however large the file.
+
+The running digest lives in the process that received the previous chunk.
+If a chunk lands on another process (or after a restart), the digest is
+recomputed from disk once, when the upload is finalized.
+"""
+import hashlib
+import re
+import threading
+import uuid
+from datetime import timedelta
+from typing import Optional, Tuple
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Document, UploadSession
+
+
+COPY_BLOCK = 1024 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# upload_id -> (running sha256, bytes hashed so far)
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+class IncompleteChunk(ValueError):
+    pass
+
+
+def parse_content_range(header: str) -> Tuple[int, int, int]:
+    """(start, end, total) of a ``bytes start-end/total`` header, end inclusive"""
+    match = CONTENT_RANGE.match(header.strip())
+    if not match:
+        raise ValueError(f"Invalid Content-Range: {header!r}")
+    start, end, total = (int(group) for group in match.groups())
+    if end < start or end >= total:
+        raise ValueError(f"Invalid Content-Range: {header!r}")
+    return start, end, total
+
+
+def discard_stale_uploads():
+    """Delete uploads untouched for UPLOAD_SESSION_TTL, with their partial files"""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    for upload in UploadSession.objects.filter(updated_at__lt=cutoff):
+        upload.file.delete(save=False)
+        upload.delete()
+        forget_digest(upload.upload_id)
+
+
+def create_upload(conversation, filename: str, file_type: str, size: int) -> UploadSession:
+    """Reserve the final media path with an empty file and record the upload"""
+    discard_stale_uploads()
+    name = default_storage.save(f"documents/{filename}", ContentFile(b''))
+    return UploadSession.objects.create(
+        upload_id=uuid.uuid4().hex,
+        conversation=conversation,
+        file=name,
+        file_type=file_type,
+        original_filename=filename,
+        size=size
+    )
+
+
+def forget_digest(upload_id: str):
+    with _digests_lock:
+        _digests.pop(upload_id, None)
+
+
+def write_chunk(upload: UploadSession, start: int, length: int, stream) -> None:
+    """
+    Copy `length` bytes from the request stream into the upload's file at
+    `start`, advancing the running digest when it is in step with the file.
+    """
+    with _digests_lock:
+        entry = _digests.get(upload.upload_id)
+    digest = hashlib.sha256() if start == 0 else (entry[0] if entry and entry[1] == start else None)
+
+    written = 0
+    try:
+        with open(upload.file.path, 'r+b') as out:
+            out.seek(start)
+            while written < length:
+                block = stream.read(min(COPY_BLOCK, length - written))
+                if not block:
+                    break
+                out.write(block)
+                if digest is not None:
+                    digest.update(block)
+                written += len(block)
+        if written != length:
+            raise IncompleteChunk(f"Expected {length} bytes, received {written}")
+    except Exception:
+        # The digest may have absorbed part of the chunk
+        forget_digest(upload.upload_id)
+        raise
+
+    with _digests_lock:
+        if digest is not None:
+            _digests[upload.upload_id] = (digest, start + length)
+        else:
+            _digests.pop(upload.upload_id, None)
+
+
+def upload_digest(upload: UploadSession) -> str:
+    """SHA-256 of the completed file, from the running digest when this process has it"""
+    with _digests_lock:
+        entry = _digests.pop(upload.upload_id, None)
+    if entry and entry[1] == upload.size:
+        return entry[0].hexdigest()
+    digest = hashlib.sha256()
+    with open(upload.file.path, 'rb') as file:
+        for block in iter(lambda: file.read(COPY_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload: UploadSession, file_hash: str) -> Optional[Document]:
+    """
+    Turn a fully received upload into a pending document pointing at the same
+    file. Returns None if a concurrent request completed it first.
+    """
+    with transaction.atomic():
+        # Deleting the session claims it, so only one request creates the document
+        deleted, _ = UploadSession.objects.filter(pk=upload.pk, received=upload.size).delete()
+        if not deleted:
+            return None
+        return Document.objects.create(
+            conversation_id=upload.conversation_id,
+            file=upload.file.name,
+            file_type=upload.file_type,
+            original_filename=upload.original_filename,
+            content_hash=file_hash
+        )
@@ -6,7 +6,16 @@ urlpatterns = [
     path('api/conversations/', views.get_conversations, name='get_conversations'),
     path('api/conversations/start/', views.start_conversation, name='start_conversation'),
     path('api/conversations/<str:session_id>/', views.get_conversation, name='get_conversation'),
+    path('api/conversations/<str:session_id>/messages/', views.get_messages, name='get_messages'),
     path('api/conversations/<str:session_id>/delete/', views.delete_conversation, name='delete_conversation'),
     path('api/chat/', views.send_message, name='send_message'),
+    path('api/chat/stream/', views.stream_message, name='stream_message'),
     path('api/upload/', views.upload_file, name='upload_file'),
+    path('api/upload/batch/', views.upload_files, name='upload_files'),
+    path('api/uploads/', views.start_upload, name='start_upload'),
+    path('api/uploads/<str:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('api/uploads/<str:upload_id>/complete/', views.finish_upload, name='finish_upload'),
+    path('api/documents/<int:document_id>/status/', views.get_document_status, name='get_document_status'),
+    path('api/llm/stats/', views.get_llm_stats, name='get_llm_stats'),
+    path('metrics', views.metrics, name='metrics'),
 ]
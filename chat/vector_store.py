@@ -0,0 +1,215 @@
+"""
+Layouts for document chunks in ChromaDB.
+
+``VECTORDB_INDEX_MODE = 'per_conversation'`` keeps the original layout of one
+``conversation_<session_id>`` collection per chat. ``'shared'`` stores every
+chunk in ``VECTORDB_SHARDS`` collections named ``chunks_<n>``, records the
+conversation and document in each chunk's metadata and filters queries on
+them. A conversation always maps to the same shard, so changing the shard
+count requires re-running ``python manage.py migrate_vectordb_collections``.
+
+``VECTORDB_MODE = 'embedded'`` opens the index in-process. ``'server'`` talks
+to one ``python manage.py vectordb_server`` process on ``VECTORDB_HOST`` /
+``VECTORDB_PORT``, so the HNSW indexes are loaded once for all web and
+ingestion workers and their writes are serialized by the server.
+"""
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+CONVERSATION_PREFIX = "conversation_"
+SHARD_PREFIX = "chunks_"
+
+
+def get_chroma_client():
+    """Chroma client for VECTORDB_MODE, falling back to embedded if the server is unreachable and allowed"""
+    # Imported here so that importing the views doesn't load chromadb
+    import chromadb
+    from chromadb.config import Settings
+
+    mode = settings.VECTORDB_MODE
+    if mode == 'server':
+        try:
+            # The HTTP client keeps a pool of keep-alive connections to the server
+            client = chromadb.HttpClient(
+                host=settings.VECTORDB_HOST,
+                port=settings.VECTORDB_PORT,
+                settings=Settings(anonymized_telemetry=False)
+            )
+            client.heartbeat()
+            logger.info("Using vector store server at %s:%s", settings.VECTORDB_HOST, settings.VECTORDB_PORT)
+            return client
+        except Exception as e:
+            if not settings.VECTORDB_SERVER_FALLBACK:
+                raise
+            logger.warning("Vector store server unavailable, opening %s in-process: %s", settings.VECTORDB_PATH, e)
+    elif mode != 'embedded':
+        raise ValueError(f"Unknown vector store mode: {mode}")
+
+    settings.VECTORDB_PATH.mkdir(exist_ok=True)
+    return chromadb.PersistentClient(
+        path=str(settings.VECTORDB_PATH),
+        settings=Settings(anonymized_telemetry=False)
+    )
+
+
+class PerConversationIndex:
+    """
+    One collection per conversation, as originally laid out.
+
+    Open collection handles are kept in an LRU of `handle_cache_size`
+    entries, so repeated reads and writes skip Chroma's metadata lookups.
+    """
+
+    mode = 'per_conversation'
+
+    def __init__(self, client, embedding_function, handle_cache_size: int = 0):
+        self.client = client
+        self.embedding_function = embedding_function
+        self.handle_cache_size = handle_cache_size
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def collection_name(self, conversation_id: str) -> str:
+        return f"{CONVERSATION_PREFIX}{conversation_id}"
+
+    def _cached_handle(self, name: str):
+        with self._lock:
+            collection = self._handles.get(name)
+            if collection is not None:
+                self._handles.move_to_end(name)
+            return collection
+
+    def _remember(self, name: str, collection):
+        if not self.handle_cache_size:
+            return collection
+        with self._lock:
+            self._handles[name] = collection
+            self._handles.move_to_end(name)
+            while len(self._handles) > self.handle_cache_size:
+                self._handles.popitem(last=False)
+        return collection
+
+    def forget(self, conversation_id: str):
+        """Drop the cached handle, e.g. after the collection was deleted by another process"""
+        with self._lock:
+            self._handles.pop(self.collection_name(conversation_id), None)
+
+    def collection_for(self, conversation_id: str):
+        """Collection that receives a conversation's chunks, created on first use"""
+        name = self.collection_name(conversation_id)
+        collection = self._cached_handle(name)
+        if collection is None:
+            collection = self._remember(name, self.client.get_or_create_collection(
+                name,
+                embedding_function=self.embedding_function
+            ))
+        return collection
+
+    def find_collection(self, conversation_id: str):
+        """Collection holding a conversation's chunks, or None if nothing was ever written"""
+        name = self.collection_name(conversation_id)
+        collection = self._cached_handle(name)
+        if collection is not None:
+            return collection
+        try:
+            collection = self.client.get_collection(
+                name,
+                embedding_function=self.embedding_function
+            )
+        except Exception:
+            # Missing collections are not cached: the first upload creates them
+            return None
+        return self._remember(name, collection)
+
+    def chunk_metadata(self, conversation_id: str) -> dict:
+        """Metadata stored on every chunk in addition to document_id and chunk_index"""
+        return {}
+
+    def where(self, conversation_id: str, document_ids: Optional[List[str]] = None) -> Optional[dict]:
+        """Query filter restricting results to the conversation (and documents, if given)"""
+        return {"document_id": {"$in": document_ids}} if document_ids else None
+
+    def delete_conversation(self, conversation_id: str):
+        if self.find_collection(conversation_id) is not None:
+            self.forget(conversation_id)
+            self.client.delete_collection(self.collection_name(conversation_id))
+
+
+class SharedIndex(PerConversationIndex):
+    """All conversations in a fixed number of collections, separated by metadata filters"""
+
+    mode = 'shared'
+
+    def __init__(self, client, embedding_function, shards: int = 1, handle_cache_size: int = 0):
+        super().__init__(client, embedding_function, handle_cache_size)
+        self.shards = max(1, shards)
+
+    def collection_name(self, conversation_id: str) -> str:
+        shard = zlib.crc32(conversation_id.encode('utf-8')) % self.shards
+        return f"{SHARD_PREFIX}{shard}"
+
+    def find_collection(self, conversation_id: str):
+        # Shards are shared, so an existing shard says nothing about this conversation;
+        # the conversation_id filter does that
+        return self.collection_for(conversation_id)
+
+    def chunk_metadata(self, conversation_id: str) -> dict:
+        return {"conversation_id": conversation_id}
+
+    def where(self, conversation_id: str, document_ids: Optional[List[str]] = None) -> dict:
+        conversation_filter = {"conversation_id": conversation_id}
+        if not document_ids:
+            return conversation_filter
+        return {"$and": [conversation_filter, {"document_id": {"$in": document_ids}}]}
+
+    def delete_conversation(self, conversation_id: str):
+        self.collection_for(conversation_id).delete(where={"conversation_id": conversation_id})
+
+
+def get_vector_index(client, embedding_function, mode: str, shards: int = 1,
+                     handle_cache_size: int = 0) -> PerConversationIndex:
+    """Build the chunk layout selected by VECTORDB_INDEX_MODE"""
+    if mode == 'per_conversation':
+        return PerConversationIndex(client, embedding_function, handle_cache_size)
+    if mode == 'shared':
+        return SharedIndex(client, embedding_function, shards, handle_cache_size)
+    raise ValueError(f"Unknown vector index mode: {mode}")
+
+
+def fold_conversation_collection(client, name: str, index: SharedIndex, batch_size: int,
+                                 delete: bool = False) -> int:
+    """Copy one per-conversation collection into the shared layout, returning the chunks moved"""
+    conversation_id = name[len(CONVERSATION_PREFIX):]
+    source = client.get_collection(name)
+    target = index.collection_for(conversation_id)
+    extra = index.chunk_metadata(conversation_id)
+
+    moved = 0
+    while True:
+        # Page through the source so large conversations are never loaded at once
+        page = source.get(
+            limit=batch_size, offset=moved,
+            include=['documents', 'embeddings', 'metadatas']
+        )
+        if not page['ids']:
+            break
+        # Upsert keeps the command safe to re-run after an interruption
+        target.upsert(
+            ids=page['ids'],
+            documents=page['documents'],
+            embeddings=page['embeddings'],
+            metadatas=[{**(metadata or {}), **extra} for metadata in page['metadatas']]
+        )
+        moved += len(page['ids'])
+
+    if delete:
+        client.delete_collection(name)
+    return moved
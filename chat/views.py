@@ -1,25 +1,163 @@
-from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.response import Response
+from functools import wraps
+from typing import Optional
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from .models import Conversation, Message, Document
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig, TooManyFilesSent
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from .models import Conversation, Message, Document, UploadSession
 from .serializers import (
-    ConversationSerializer, 
-    MessageSerializer, 
+    ConversationSerializer,
+    ConversationDetailSerializer,
+    ConversationSummarySerializer,
+    MessageSerializer,
     DocumentSerializer,
     ChatRequestSerializer,
-    FileUploadSerializer
+    FileUploadSerializer,
+    UploadStartSerializer
 )
-from .ai_service import AIService
+from .ai_service import get_ai_service
+from .caches import hash_uploaded_file
+from .history import aget_history, schedule_fold
+from .ingestion import enqueue_document, enqueue_documents
+from .metrics import REGISTRY, stage
+from .uploads import (
+    IncompleteChunk, complete_upload, create_upload, forget_digest, parse_content_range, upload_digest, write_chunk
+)
+from .pagination import InvalidCursor, after, before, decode_cursor, encode_cursor, page_size, split_page
+import asyncio
+import json
 import os
 import uuid
 
 
-# Initialize AI service
-ai_service = AIService()
+# Shared AI service; its clients and models are built on first use (or by pre-warming)
+ai_service = get_ai_service()
+
+
+def async_api_view(http_method_names):
+    """Async counterpart of DRF's @api_view: restricts methods and exempts the view from CSRF"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in http_method_names:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            return await view_func(request, *args, **kwargs)
+
+        # Django 4.2's csrf_exempt only wraps sync views, so set the flag directly
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _request_data(request) -> dict:
+    """Parse the request body as JSON or form data (including uploaded files)"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    data = request.POST.dict()
+    data.update(request.FILES.dict())
+    return data
+
+
+async def _parse_request(request):
+    """Parse the request body off the event loop, returning (data, error_response)"""
+    try:
+        return await sync_to_async(_request_data)(request), None
+    except json.JSONDecodeError as e:
+        return None, JsonResponse({'detail': f'JSON parse error - {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+async def _get_or_create_conversation(session_id):
+    """Return (session_id, conversation), creating a new conversation if needed"""
+    if not session_id:
+        session_id = ai_service.create_conversation()
+        conversation = await Conversation.objects.acreate(session_id=session_id)
+    else:
+        conversation, _ = await Conversation.objects.aget_or_create(session_id=session_id)
+    return session_id, conversation
+
+
+async def _get_ready_document_ids(conversation) -> list:
+    """IDs of the conversation's documents that have finished ingesting"""
+    return [
+        str(document_id) async for document_id in conversation.documents.filter(
+            status=Document.STATUS_READY
+        ).values_list('id', flat=True)
+    ]
+
+
+def _count(model, **filters):
+    """Correlated count of `model` rows pointing at the outer conversation"""
+    rows = model.objects.filter(conversation=OuterRef('pk'), **filters).order_by()
+    return Coalesce(
+        Subquery(rows.values('conversation').annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+        Value(0)
+    )
+
+
+def _conversation_listing():
+    """Conversations with their counts and last message, annotated so a page is a single query"""
+    last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+    return Conversation.objects.annotate(
+        message_count=_count(Message),
+        document_count=_count(Document),
+        last_message=Subquery(
+            last_message.annotate(
+                preview=Substr('content', 1, settings.CONVERSATION_PREVIEW_CHARS)
+            ).values('preview')[:1]
+        ),
+        last_message_at=Subquery(last_message.values('timestamp')[:1]),
+    ).order_by('-created_at', '-id')
+
+
+async def _message_page(conversation_id: int, query, newest: bool) -> dict:
+    """
+    One page of a conversation's messages, in chronological order.
+
+    ``?after=`` pages forward from a cursor and ``?before=`` pages back from
+    one (both together bound a range); with neither the page holds the oldest
+    messages, or the newest if `newest`. Raises InvalidCursor.
+    """
+    limit = page_size(query.get('limit'), settings.MESSAGES_PAGE_SIZE, settings.API_MAX_PAGE_SIZE)
+    after_key = decode_cursor(query['after']) if query.get('after') else None
+    before_key = decode_cursor(query['before']) if query.get('before') else None
+    messages = Message.objects.filter(conversation_id=conversation_id)
+    if after_key:
+        messages = messages.filter(after('timestamp', *after_key))
+    if before_key:
+        messages = messages.filter(before('timestamp', *before_key))
+
+    # Paging back reads newest first and flips the page
+    backwards = after_key is None and (before_key is not None or newest)
+    order = ('-timestamp', '-id') if backwards else ('timestamp', 'id')
+    rows, has_more = split_page([message async for message in messages.order_by(*order)[:limit + 1]], limit)
+    if backwards:
+        rows.reverse()
+        has_older, has_newer = has_more, before_key is not None
+    else:
+        has_older, has_newer = after_key is not None, has_more or before_key is not None
+    return {
+        'messages': MessageSerializer(rows, many=True).data,
+        'older_cursor': encode_cursor(rows[0].timestamp, rows[0].id) if rows and has_older else None,
+        'newer_cursor': encode_cursor(rows[-1].timestamp, rows[-1].id) if rows and has_newer else None,
+    }
+
+
+def _file_type(filename: str) -> Optional[str]:
+    """Document type of an upload, by extension, or None if unsupported"""
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension == 'pdf':
+        return 'pdf'
+    if file_extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
+        return 'image'
+    return None
 
 
 def index(request):
@@ -27,166 +165,414 @@ def index(request):
     return render(request, 'chat/index.html')
 
 
-@api_view(['POST'])
-def start_conversation(request):
+@async_api_view(['POST'])
+async def start_conversation(request):
     """Start a new conversation"""
     session_id = ai_service.create_conversation()
-    conversation = Conversation.objects.create(session_id=session_id)
-    serializer = ConversationSerializer(conversation)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    conversation = await Conversation.objects.acreate(session_id=session_id)
+    data = await sync_to_async(lambda: ConversationSerializer(conversation).data)()
+    return JsonResponse(data, status=status.HTTP_201_CREATED)
 
 
-@api_view(['GET'])
-def get_conversation(request, session_id):
-    """Get conversation by session ID"""
+@async_api_view(['GET'])
+async def get_conversation(request, session_id):
+    """
+    Get conversation by session ID, with its documents and the newest page of
+    messages (older ones via ?before=older_cursor). Three queries however long
+    the history is.
+    """
     try:
-        conversation = Conversation.objects.get(session_id=session_id)
-        serializer = ConversationSerializer(conversation)
-        return Response(serializer.data)
+        conversation = await Conversation.objects.prefetch_related('documents').aget(session_id=session_id)
     except Conversation.DoesNotExist:
-        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        page = await _message_page(conversation.id, request.GET, newest=True)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({**ConversationDetailSerializer(conversation).data, **page})
 
 
-@csrf_exempt
-@api_view(['POST'])
-def send_message(request):
+@async_api_view(['POST'])
+async def send_message(request):
     """Send a message and get AI response"""
-    # Handle both JSON and form data
-    if request.content_type == 'application/json':
-        data = request.data
-    else:
-        data = request.POST
-    
+    data, error = await _parse_request(request)
+    if error:
+        return error
+
     serializer = ChatRequestSerializer(data=data)
     if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     message = serializer.validated_data['message']
-    session_id = serializer.validated_data.get('session_id')
-    
-    # Create new conversation if no session_id provided
-    if not session_id:
-        session_id = ai_service.create_conversation()
-        conversation = Conversation.objects.create(session_id=session_id)
-    else:
-        try:
-            conversation = Conversation.objects.get(session_id=session_id)
-        except Conversation.DoesNotExist:
-            conversation = Conversation.objects.create(session_id=session_id)
-    
-    # Save user message
-    user_message = Message.objects.create(
-        conversation=conversation,
-        message_type='user',
-        content=message
+    session_id, conversation = await _get_or_create_conversation(
+        serializer.validated_data.get('session_id')
     )
-    
-    # Get chat history for context
-    chat_history = list(conversation.messages.values('message_type', 'content').order_by('timestamp'))
-    
+
+    # Save user message
+    with stage('db_write'):
+        user_message = await Message.objects.acreate(
+            conversation=conversation,
+            message_type='user',
+            content=message
+        )
+
+    # Recent turns within the token budget plus a summary of the older ones;
+    # the message just saved is sent separately
+    history_summary, chat_history = await aget_history(conversation, before_id=user_message.id)
+    document_ids = await _get_ready_document_ids(conversation)
+
     # Generate AI response
-    ai_response = ai_service.generate_response(message, session_id, chat_history)
-    
-    # Save AI response
-    ai_message = Message.objects.create(
-        conversation=conversation,
-        message_type='assistant',
-        content=ai_response
+    ai_response = await ai_service.agenerate_response(
+        message, session_id, chat_history, document_ids, history_summary
     )
-    
+
+    # Save AI response
+    with stage('db_write'):
+        ai_message = await Message.objects.acreate(
+            conversation=conversation,
+            message_type='assistant',
+            content=ai_response
+        )
+    schedule_fold(conversation.id, ai_service)
+
     # Return both messages
     user_serializer = MessageSerializer(user_message)
     ai_serializer = MessageSerializer(ai_message)
-    
-    return Response({
+
+    return JsonResponse({
         'session_id': session_id,
         'user_message': user_serializer.data,
         'ai_message': ai_serializer.data
     })
 
 
-@csrf_exempt
-@api_view(['POST'])
-@parser_classes([MultiPartParser, FormParser])
-def upload_file(request):
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@async_api_view(['POST'])
+async def stream_message(request):
+    """Send a message and stream the AI response as Server-Sent Events"""
+    data, error = await _parse_request(request)
+    if error:
+        return error
+
+    serializer = ChatRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    message = serializer.validated_data['message']
+    session_id, conversation = await _get_or_create_conversation(
+        serializer.validated_data.get('session_id')
+    )
+
+    # Save user message
+    with stage('db_write'):
+        user_message = await Message.objects.acreate(
+            conversation=conversation,
+            message_type='user',
+            content=message
+        )
+
+    # Recent turns within the token budget plus a summary of the older ones;
+    # the message just saved is sent separately
+    history_summary, chat_history = await aget_history(conversation, before_id=user_message.id)
+    document_ids = await _get_ready_document_ids(conversation)
+
+    async def event_stream():
+        yield _sse_event('session', {
+            'session_id': session_id,
+            'user_message': MessageSerializer(user_message).data,
+        })
+
+        tokens = []
+        async for token in ai_service.astream_response(
+            message, session_id, chat_history, document_ids, history_summary
+        ):
+            tokens.append(token)
+            yield _sse_event('token', {'content': token})
+
+        # Persist the assistant reply only once the stream has completed
+        with stage('db_write'):
+            ai_message = await Message.objects.acreate(
+                conversation=conversation,
+                message_type='assistant',
+                content="".join(tokens)
+            )
+        schedule_fold(conversation.id, ai_service)
+        yield _sse_event('done', {'ai_message': MessageSerializer(ai_message).data})
+
+    # An async iterator lets the ASGI handler flush each event as it is produced
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_api_view(['POST'])
+async def upload_file(request):
     """Upload and process a file"""
-    serializer = FileUploadSerializer(data=request.data)
+    data, error = await _parse_request(request)
+    if error:
+        return error
+
+    serializer = FileUploadSerializer(data=data)
     if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     file = serializer.validated_data['file']
-    session_id = serializer.validated_data.get('session_id')
-    
-    # Create new conversation if no session_id provided
-    if not session_id:
-        session_id = ai_service.create_conversation()
-        conversation = Conversation.objects.create(session_id=session_id)
-    else:
-        try:
-            conversation = Conversation.objects.get(session_id=session_id)
-        except Conversation.DoesNotExist:
-            conversation = Conversation.objects.create(session_id=session_id)
-    
-    # Determine file type
-    file_extension = file.name.split('.')[-1].lower()
-    if file_extension == 'pdf':
-        file_type = 'pdf'
-    elif file_extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
-        file_type = 'image'
-    else:
-        return Response({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Save document
-    document = Document.objects.create(
-        conversation=conversation,
-        file=file,
-        file_type=file_type,
-        original_filename=file.name
+    session_id, conversation = await _get_or_create_conversation(
+        serializer.validated_data.get('session_id')
     )
-    
-    # Process file content
-    file_path = document.file.path
-    processed_content = ""
-    
-    if file_type == 'pdf':
-        processed_content = ai_service.process_pdf(file_path)
-    elif file_type == 'image':
-        processed_content = ai_service.process_image(file_path)
-    
-    # Update document with processed content
-    document.processed_content = processed_content
-    document.save()
-    
-    # Add to vector database
-    if processed_content:
-        ai_service.add_document_to_vectordb(
-            processed_content, 
-            str(document.id), 
-            session_id
+
+    file_type = _file_type(file.name)
+    if file_type is None:
+        return JsonResponse({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Fingerprint the upload so a file seen before can reuse its extracted chunks
+    with stage('upload_hash'):
+        content_hash = await sync_to_async(hash_uploaded_file, thread_sensitive=False)(file)
+
+    # Save document; extraction and embedding happen in the background
+    with stage('upload_save'):
+        document = await Document.objects.acreate(
+            conversation=conversation,
+            file=file,
+            file_type=file_type,
+            original_filename=file.name,
+            content_hash=content_hash
         )
-    
+    enqueue_document(document.id, ai_service)
+
     serializer = DocumentSerializer(document)
-    return Response({
+    return JsonResponse({
         'session_id': session_id,
         'document': serializer.data,
-        'message': 'File uploaded and processed successfully'
+        'message': 'File uploaded, processing started'
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@async_api_view(['POST'])
+async def upload_files(request):
+    """
+    Upload several files (multipart field `files`, repeated) in one request.
+    They are ingested together in the background; the response has one
+    result per file, in upload order.
+    """
+    try:
+        files, session_id = await sync_to_async(
+            lambda: (request.FILES.getlist('files'), request.POST.get('session_id'))
+        )()
+    except (RequestDataTooBig, TooManyFilesSent) as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not files:
+        return JsonResponse({'error': 'No files uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        return JsonResponse(
+            {'error': f'At most {settings.UPLOAD_BATCH_MAX_FILES} files per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    session_id, conversation = await _get_or_create_conversation(session_id)
+    accepted = [(file, _file_type(file.name)) for file in files]
+    accepted = [(file, file_type) for file, file_type in accepted if file_type]
+    # Files are hashed concurrently, each in its own worker thread
+    with stage('upload_hash'):
+        hashes = await asyncio.gather(*(
+            sync_to_async(hash_uploaded_file, thread_sensitive=False)(file) for file, _ in accepted
+        ))
+    documents = {}
+    for (file, file_type), content_hash in zip(accepted, hashes):
+        with stage('upload_save'):
+            documents[id(file)] = await Document.objects.acreate(
+                conversation=conversation,
+                file=file,
+                file_type=file_type,
+                original_filename=file.name,
+                content_hash=content_hash
+            )
+    if documents:
+        enqueue_documents([document.id for document in documents.values()], ai_service)
+
+    results = [
+        {'filename': file.name, 'document': DocumentSerializer(documents[id(file)]).data}
+        if id(file) in documents else {'filename': file.name, 'error': 'Unsupported file type'}
+        for file in files
+    ]
+    return JsonResponse({
+        'session_id': session_id,
+        'results': results,
+        'message': f'{len(documents)} of {len(files)} files uploaded, processing started'
+    }, status=status.HTTP_202_ACCEPTED if documents else status.HTTP_400_BAD_REQUEST)
+
+
+def _upload_state(upload: UploadSession) -> dict:
+    return {'upload_id': upload.upload_id, 'offset': upload.received, 'size': upload.size}
+
+
+@async_api_view(['POST'])
+async def start_upload(request):
+    """Open a resumable upload; the file is then sent in Content-Range chunks"""
+    data, error = await _parse_request(request)
+    if error:
+        return error
+
+    serializer = UploadStartSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    filename = os.path.basename(serializer.validated_data['filename'])
+    size = serializer.validated_data['size']
+    file_type = _file_type(filename)
+    if file_type is None:
+        return JsonResponse({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
+    if size > settings.UPLOAD_MAX_BYTES:
+        return JsonResponse(
+            {'error': f'Files may be at most {settings.UPLOAD_MAX_BYTES} bytes'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    session_id, conversation = await _get_or_create_conversation(serializer.validated_data.get('session_id'))
+    upload = await sync_to_async(create_upload)(conversation, filename, file_type, size)
+    return JsonResponse({
+        'session_id': session_id,
+        'chunk_size': settings.UPLOAD_CHUNK_BYTES,
+        **_upload_state(upload)
+    }, status=status.HTTP_201_CREATED)
+
+
+@async_api_view(['GET', 'PUT'])
+async def upload_chunk(request, upload_id):
+    """
+    GET: how many bytes of the upload have been received, to resume from.
+    PUT: append the request body at the byte range in its Content-Range header.
+    """
+    try:
+        upload = await UploadSession.objects.aget(upload_id=upload_id)
+    except UploadSession.DoesNotExist:
+        return JsonResponse({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'GET':
+        return JsonResponse(_upload_state(upload))
+
+    try:
+        start, end, total = parse_content_range(request.headers.get('Content-Range', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    length = end - start + 1
+    if total != upload.size:
+        return JsonResponse({'error': 'Content-Range total does not match the upload size'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    if length > settings.UPLOAD_CHUNK_MAX_BYTES:
+        return JsonResponse({'error': f'Chunks may be at most {settings.UPLOAD_CHUNK_MAX_BYTES} bytes'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    if start != upload.received:
+        # Chunks are accepted in order only; the client resumes from the returned offset
+        return JsonResponse(_upload_state(upload), status=status.HTTP_409_CONFLICT)
+
+    try:
+        with stage('upload_chunk'):
+            await sync_to_async(write_chunk, thread_sensitive=False)(upload, start, length, request)
+    except IncompleteChunk as e:
+        return JsonResponse({'error': str(e), **_upload_state(upload)}, status=status.HTTP_400_BAD_REQUEST)
+
+    updated = await UploadSession.objects.filter(pk=upload.pk, received=start).aupdate(
+        received=start + length, updated_at=timezone.now()
+    )
+    if not updated:
+        # Another request wrote this range concurrently
+        forget_digest(upload.upload_id)
+        await upload.arefresh_from_db()
+        return JsonResponse(_upload_state(upload), status=status.HTTP_409_CONFLICT)
+    upload.received = start + length
+    return JsonResponse(_upload_state(upload))
+
+
+@async_api_view(['POST'])
+async def finish_upload(request, upload_id):
+    """Finalize a fully received upload and start processing it in place"""
+    try:
+        upload = await UploadSession.objects.select_related('conversation').aget(upload_id=upload_id)
+    except UploadSession.DoesNotExist:
+        return JsonResponse({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if upload.received != upload.size:
+        return JsonResponse({'error': 'Upload is incomplete', **_upload_state(upload)},
+                            status=status.HTTP_409_CONFLICT)
+
+    with stage('upload_hash'):
+        file_hash = await sync_to_async(upload_digest, thread_sensitive=False)(upload)
+    with stage('upload_save'):
+        document = await sync_to_async(complete_upload)(upload, file_hash)
+    if document is None:
+        return JsonResponse({'error': 'Upload was already completed'}, status=status.HTTP_409_CONFLICT)
+    enqueue_document(document.id, ai_service)
+    return JsonResponse({
+        'session_id': upload.conversation.session_id,
+        'document': DocumentSerializer(document).data,
+        'message': 'File uploaded, processing started'
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@async_api_view(['GET'])
+async def get_document_status(request, document_id):
+    """Get the ingestion status of an uploaded document"""
+    try:
+        document = await Document.objects.aget(pk=document_id)
+    except Document.DoesNotExist:
+        return JsonResponse({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    serializer = DocumentSerializer(document)
+    return JsonResponse(serializer.data)
+
+
+@async_api_view(['GET'])
+async def get_conversations(request):
+    """List conversations, newest first, one page per request (?limit=, ?cursor=)"""
+    limit = page_size(request.GET.get('limit'), settings.CONVERSATIONS_PAGE_SIZE, settings.API_MAX_PAGE_SIZE)
+    conversations = _conversation_listing()
+    if request.GET.get('cursor'):
+        try:
+            created_at, pk = decode_cursor(request.GET['cursor'])
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        conversations = conversations.filter(before('created_at', created_at, pk))
+    rows, has_more = split_page([conversation async for conversation in conversations[:limit + 1]], limit)
+    return JsonResponse({
+        'results': ConversationSummarySerializer(rows, many=True).data,
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
     })
 
 
-@api_view(['GET'])
-def get_conversations(request):
-    """Get all conversations"""
-    conversations = Conversation.objects.all()
-    serializer = ConversationSerializer(conversations, many=True)
-    return Response(serializer.data)
+@async_api_view(['GET'])
+async def get_messages(request, session_id):
+    """A page of a conversation's messages (?limit=, ?before= or ?after= cursors)"""
+    try:
+        conversation_id = await Conversation.objects.values_list('id', flat=True).aget(session_id=session_id)
+    except Conversation.DoesNotExist:
+        return JsonResponse({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        return JsonResponse(await _message_page(conversation_id, request.GET, newest=False))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['GET'])
+async def get_llm_stats(request):
+    """LLM gateway queue depth, wait times and retries, plus response and prompt cache counters"""
+    return JsonResponse(ai_service.stats())
+
+
+@async_api_view(['GET'])
+async def metrics(request):
+    """Stage latencies, cache hit rates, token counts and gateway state in the Prometheus text format"""
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
-@api_view(['DELETE'])
-def delete_conversation(request, session_id):
+@async_api_view(['DELETE'])
+async def delete_conversation(request, session_id):
     """Delete a conversation"""
     try:
-        conversation = Conversation.objects.get(session_id=session_id)
-        conversation.delete()
-        return Response({'message': 'Conversation deleted successfully'})
+        conversation = await Conversation.objects.aget(session_id=session_id)
     except Conversation.DoesNotExist:
-        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    await conversation.adelete()
+    await ai_service.adelete_conversation_vectors(session_id)
+    return JsonResponse({'message': 'Conversation deleted successfully'})
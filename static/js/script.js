@@ -2,6 +2,9 @@ class ChatApp {
     constructor() {
         this.sessionId = null;
         this.uploadedFiles = [];
+        // Cursor of the oldest loaded message while older history remains on the server
+        this.olderCursor = null;
+        this.loadingOlder = false;
         this.initializeEventListeners();
         this.loadSessionFromStorage();
     }
@@ -22,6 +25,13 @@ class ChatApp {
             e.target.style.height = e.target.scrollHeight + 'px';
         });
 
+        // Load older history when scrolled to the top
+        document.getElementById('chatMessages').addEventListener('scroll', (e) => {
+            if (e.target.scrollTop < 100) {
+                this.loadOlderMessages();
+            }
+        });
+
         // New chat
         document.getElementById('newChatBtn').addEventListener('click', () => this.startNewChat());
 
@@ -116,25 +126,19 @@ class ChatApp {
                 requestData.session_id = this.sessionId;
             }
             
-            const response = await fetch('/api/chat/', {
+            const response = await fetch('/api/chat/stream/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
                 },
                 body: JSON.stringify(requestData),
             });
 
             console.log('Response status:', response.status);
-            console.log('Response headers:', response.headers);
 
             if (response.ok) {
-                const data = await response.json();
-                console.log('Response data:', data);
-                this.sessionId = data.session_id;
-                this.saveSessionToStorage();
-                
-                // Add AI response to chat
-                this.addMessageToChat('assistant', data.ai_message.content);
+                await this.readMessageStream(response);
             } else {
                 const errorText = await response.text();
                 console.error('Error response:', errorText);
@@ -153,6 +157,60 @@ class ChatApp {
         }
     }
 
+    async readMessageStream(response) {
+        // Consume the Server-Sent Events stream and render tokens as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const chatMessages = document.getElementById('chatMessages');
+        let buffer = '';
+        let replyText = null;
+
+        const handleEvent = (event, data) => {
+            if (event === 'session') {
+                this.sessionId = data.session_id;
+                this.saveSessionToStorage();
+            } else if (event === 'token') {
+                if (!replyText) {
+                    // First token has arrived, swap the spinner for the reply bubble
+                    this.hideLoading();
+                    replyText = this.addMessageToChat('assistant', '');
+                }
+                replyText.nodeValue += data.content;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (event === 'done') {
+                console.log('Response data:', data);
+                if (!replyText) {
+                    this.addMessageToChat('assistant', data.ai_message.content);
+                }
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (data) {
+                    handleEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+
     async handleFileUpload(files) {
         if (!files || files.length === 0) return;
 
@@ -171,36 +229,10 @@ class ChatApp {
         this.showLoading();
 
         try {
-            for (const file of validFiles) {
-                const formData = new FormData();
-                formData.append('file', file);
-                if (this.sessionId) {
-                    formData.append('session_id', this.sessionId);
-                }
-
-                const response = await fetch('/api/upload/', {
-                    method: 'POST',
-                    body: formData,
-                });
-
-                if (response.ok) {
-                    const data = await response.json();
-                    this.sessionId = data.session_id;
-                    this.saveSessionToStorage();
-                    
-                    // Add file to uploaded files list
-                    this.uploadedFiles.push({
-                        name: file.name,
-                        type: file.type,
-                        size: file.size
-                    });
-
-                    // Show success message
-                    this.addMessageToChat('assistant', `File "${file.name}" uploaded and processed successfully! You can now ask questions about it.`);
-                } else {
-                    const errorData = await response.json();
-                    this.showError(`Failed to upload ${file.name}: ${errorData.error}`);
-                }
+            if (validFiles.length > 1) {
+                await this.uploadBatch(validFiles);
+            } else {
+                await this.uploadFile(validFiles[0]);
             }
         } catch (error) {
             console.error('Error uploading files:', error);
@@ -210,8 +242,197 @@ class ChatApp {
         }
     }
 
+    async uploadFile(file) {
+        // Large files go in resumable chunks instead of one multipart request
+        if (file.size > 8 * 1024 * 1024) {
+            return this.uploadResumable(file);
+        }
+
+        const formData = new FormData();
+        formData.append('file', file);
+        if (this.sessionId) {
+            formData.append('session_id', this.sessionId);
+        }
+
+        const response = await fetch('/api/upload/', {
+            method: 'POST',
+            body: formData,
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            this.sessionId = data.session_id;
+            this.saveSessionToStorage();
+            this.fileAccepted(file, data.document);
+        } else {
+            const errorData = await response.json();
+            this.showError(`Failed to upload ${file.name}: ${errorData.error}`);
+        }
+    }
+
+    async uploadResumable(file) {
+        // Remembered so an interrupted upload of the same file continues where it stopped
+        const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+        let upload = null;
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            const response = await fetch(`/api/uploads/${savedId}/`);
+            if (response.ok) {
+                upload = await response.json();
+                upload.session_id = this.sessionId;
+            }
+        }
+        if (!upload) {
+            const response = await fetch('/api/uploads/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ filename: file.name, size: file.size, session_id: this.sessionId }),
+            });
+            upload = await response.json();
+            if (!response.ok) {
+                this.showError(`Failed to upload ${file.name}: ${upload.error}`);
+                return;
+            }
+            localStorage.setItem(resumeKey, upload.upload_id);
+        }
+
+        const chunkSize = upload.chunk_size || 8 * 1024 * 1024;
+        let offset = upload.offset;
+        let failures = 0;
+        while (offset < file.size) {
+            const end = Math.min(offset + chunkSize, file.size);
+            try {
+                const response = await fetch(`/api/uploads/${upload.upload_id}/`, {
+                    method: 'PUT',
+                    headers: {
+                        'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`,
+                    },
+                    body: file.slice(offset, end),
+                });
+                const data = await response.json();
+                // A conflict carries the offset the server actually has
+                if (response.ok || response.status === 409) {
+                    offset = data.offset;
+                    failures = 0;
+                    continue;
+                }
+                throw new Error(data.error);
+            } catch (error) {
+                if (++failures > 3) {
+                    this.showError(`Failed to upload ${file.name}: ${error.message}`);
+                    return;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            }
+        }
+
+        const response = await fetch(`/api/uploads/${upload.upload_id}/complete/`, { method: 'POST' });
+        const data = await response.json();
+        localStorage.removeItem(resumeKey);
+        if (response.ok) {
+            this.sessionId = data.session_id;
+            this.saveSessionToStorage();
+            this.fileAccepted(file, data.document);
+        } else {
+            this.showError(`Failed to upload ${file.name}: ${data.error}`);
+        }
+    }
+
+    async uploadBatch(files) {
+        // All files go in one request and are processed together on the server
+        const formData = new FormData();
+        files.forEach(file => formData.append('files', file));
+        if (this.sessionId) {
+            formData.append('session_id', this.sessionId);
+        }
+
+        const response = await fetch('/api/upload/batch/', {
+            method: 'POST',
+            body: formData,
+        });
+        const data = await response.json();
+        if (!data.results) {
+            this.showError(`Failed to upload files: ${data.error}`);
+            return;
+        }
+
+        this.sessionId = data.session_id;
+        this.saveSessionToStorage();
+        data.results.forEach((result, index) => {
+            if (result.document) {
+                this.fileAccepted(files[index], result.document);
+            } else {
+                this.showError(`Failed to upload ${result.filename}: ${result.error}`);
+            }
+        });
+    }
+
+    fileAccepted(file, document) {
+        // Add file to uploaded files list
+        this.uploadedFiles.push({
+            name: file.name,
+            type: file.type,
+            size: file.size
+        });
+
+        // Processing continues in the background, report once it settles
+        this.addMessageToChat('assistant', `File "${file.name}" uploaded, processing...`);
+        this.watchDocumentStatus(document.id, file.name);
+    }
+
+    async watchDocumentStatus(documentId, fileName) {
+        // Poll the ingestion status until the document is ready or has failed
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            try {
+                const response = await fetch(`/api/documents/${documentId}/status/`);
+                if (!response.ok) {
+                    this.showError(`Lost track of ${fileName}`);
+                    return;
+                }
+                const data = await response.json();
+                if (data.status === 'ready') {
+                    this.addMessageToChat('assistant', `File "${fileName}" processed successfully! You can now ask questions about it.`);
+                    return;
+                }
+                if (data.status === 'failed') {
+                    this.showError(`Failed to process ${fileName}: ${data.error}`);
+                    return;
+                }
+            } catch (error) {
+                console.error('Error checking document status:', error);
+            }
+        }
+    }
+
     addMessageToChat(type, content) {
         const chatMessages = document.getElementById('chatMessages');
+        const { messageDiv, messageText } = this.createMessageElement(type, content, new Date());
+        chatMessages.appendChild(messageDiv);
+
+        // Scroll to bottom
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+
+        // Returned so streamed replies can append to the text in place
+        return messageText;
+    }
+
+    prependMessages(messages) {
+        const chatMessages = document.getElementById('chatMessages');
+        const fragment = document.createDocumentFragment();
+        messages.forEach(msg => {
+            fragment.appendChild(this.createMessageElement(msg.message_type, msg.content, new Date(msg.timestamp)).messageDiv);
+        });
+
+        // Keep the messages the user is reading in place
+        const distanceFromBottom = chatMessages.scrollHeight - chatMessages.scrollTop;
+        chatMessages.insertBefore(fragment, chatMessages.firstChild);
+        chatMessages.scrollTop = chatMessages.scrollHeight - distanceFromBottom;
+    }
+
+    createMessageElement(type, content, time) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${type}`;
 
@@ -221,25 +442,24 @@ class ChatApp {
 
         const messageContent = document.createElement('div');
         messageContent.className = 'message-content';
-        messageContent.textContent = content;
+        const messageText = document.createTextNode(content);
+        messageContent.appendChild(messageText);
 
         const messageTime = document.createElement('div');
         messageTime.className = 'message-time';
-        messageTime.textContent = new Date().toLocaleTimeString();
+        messageTime.textContent = time.toLocaleTimeString();
 
         messageContent.appendChild(messageTime);
         messageDiv.appendChild(avatar);
         messageDiv.appendChild(messageContent);
-        chatMessages.appendChild(messageDiv);
-
-        // Scroll to bottom
-        chatMessages.scrollTop = chatMessages.scrollHeight;
+        return { messageDiv, messageText };
     }
 
     clearChat() {
         const chatMessages = document.getElementById('chatMessages');
         chatMessages.innerHTML = '';
         this.uploadedFiles = [];
+        this.olderCursor = null;
     }
 
     showWelcomeMessage() {
@@ -329,9 +549,11 @@ class ChatApp {
                 this.clearChat();
                 
                 if (data.messages && data.messages.length > 0) {
-                    data.messages.forEach(msg => {
-                        this.addMessageToChat(msg.message_type, msg.content);
-                    });
+                    // Only the newest page is loaded; older pages follow on scroll
+                    this.prependMessages(data.messages);
+                    this.olderCursor = data.older_cursor;
+                    const chatMessages = document.getElementById('chatMessages');
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
                 } else {
                     this.showWelcomeMessage();
                 }
@@ -345,6 +567,28 @@ class ChatApp {
             this.showWelcomeMessage();
         }
     }
+
+    async loadOlderMessages() {
+        if (!this.sessionId || !this.olderCursor || this.loadingOlder) return;
+
+        this.loadingOlder = true;
+        const sessionId = this.sessionId;
+        try {
+            const response = await fetch(
+                `/api/conversations/${sessionId}/messages/?before=${encodeURIComponent(this.olderCursor)}`
+            );
+            // Ignore pages of a conversation the user has since left
+            if (response.ok && sessionId === this.sessionId) {
+                const data = await response.json();
+                this.prependMessages(data.messages);
+                this.olderCursor = data.older_cursor;
+            }
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+        } finally {
+            this.loadingOlder = false;
+        }
+    }
 }
 
 // Initialize the chat app when the page loads